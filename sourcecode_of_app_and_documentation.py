@@ -1,10 +1,50 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g, has_app_context, Response, stream_with_context
 import mysql.connector
 import jwt
 import datetime
+import atexit
+import os
+import queue
+import decimal
+import base64
+import json
+import collections
+import threading
+import time
+import re
+import zlib
+import hashlib
+import math
+import heapq
+import bisect
+import sys
+import concurrent.futures
+from multiprocessing import shared_memory
 from flask_bcrypt import Bcrypt
 from functools import wraps
 from flasgger import Swagger
+import click
+
+try:
+    import redis
+except ImportError:  # the shared cache tier is optional
+    redis = None
+
+try:
+    import numpy as np
+    import scipy.sparse
+except ImportError:  # the recommender is optional
+    np = None
+
+try:
+    import resource
+except ImportError:  # not available on Windows, the batch job then reports no peak memory
+    resource = None
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, every worker then builds its own analytics snapshot
+    fcntl = None
 
 app = Flask(__name__)
 db_initialized = False
@@ -38,18 +78,182 @@ db_config = {
     'database': 'film_recommendation_project'
 }
 
-def create_connection():
-    try:
-        connection = mysql.connector.connect(
+# Connection pool configuration
+# pool_size connections are kept open, up to max_overflow extra ones are opened under load and closed when returned,
+# checkout_timeout is how long (seconds) a request waits for a free connection, idle connections older than
+# idle_timeout are replaced on checkout and pre_ping checks that a connection is still alive before handing it out
+pool_config = {
+    'pool_size': 10,
+    'max_overflow': 10,
+    'checkout_timeout': 30,
+    'idle_timeout': 300,
+    'pre_ping': True
+}
+
+
+class PooledConnection:
+    # Wraps a mysql.connector connection borrowed from the pool, close() gives it back instead of disconnecting
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection has already been returned to the pool")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw, self._created_at)
+
+
+class ConnectionPool:
+    def __init__(self, pool_size, max_overflow, checkout_timeout, idle_timeout, pre_ping):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self._idle = collections.deque()  # (connection, created_at, returned_at), most recently returned on the right
+        self._condition = threading.Condition()
+        self._opened = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _connect(self):
+        return mysql.connector.connect(
             host=db_config['host'],
             user=db_config['user'],
             password=db_config['password'],
             database=db_config['database']
         )
-        return connection
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        raw = None
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        raw, created_at, returned_at = self._idle.pop()
+                        break
+                    if self._opened < self.pool_size + self.max_overflow:
+                        self._opened += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise mysql.connector.errors.PoolError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a database connection")
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_use += 1
+
+        # Opening, validating and replacing connections happens outside the lock so other requests are not blocked
+        try:
+            now = time.monotonic()
+            if raw is not None and self.idle_timeout and now - returned_at > self.idle_timeout:
+                self._discard(raw)
+                raw = None
+                with self._condition:
+                    self._reconnects += 1
+            elif raw is not None and self.pre_ping:
+                try:
+                    raw.ping(reconnect=False)
+                except mysql.connector.Error:
+                    self._discard(raw)
+                    raw = None
+                    with self._condition:
+                        self._reconnects += 1
+            if raw is None:
+                raw = self._connect()
+                created_at = now
+        except Exception:
+            with self._condition:
+                self._opened -= 1
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._condition:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at):
+        # Roll back whatever the borrower left uncommitted so the next request does not inherit its locks or snapshot
+        try:
+            raw.rollback()
+            healthy = True
+        except mysql.connector.Error:
+            healthy = False
+        with self._condition:
+            self._in_use -= 1
+            if healthy and self._opened <= self.pool_size:
+                self._idle.append((raw, created_at, time.monotonic()))
+                raw = None
+            else:
+                self._opened -= 1
+            self._condition.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def stats(self):
+        with self._condition:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+                'avg_checkout_ms': round(self._checkout_time_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_checkout_ms': round(self._checkout_time_max * 1000, 3)
+            }
+
+
+connection_pool = ConnectionPool(**pool_config)
+
+
+def create_connection():
+    try:
+        connection = connection_pool.acquire()
     except mysql.connector.Error as e:
         print(f"Error connecting to MySQL: {e}")
         raise
+    # Remember connections borrowed in a request (or any app context) so they are returned even if the code exits early
+    if has_app_context():
+        g.setdefault('pooled_connections', []).append(connection)
+    return connection
+
+
+@app.teardown_appcontext
+def release_context_connections(exception=None):
+    for connection in g.pop('pooled_connections', []):
+        connection.close()
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -65,6 +269,1953 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+
+# Pagination configuration
+# list endpoints return at most max_limit rows per page, default_limit when the client does not ask for a size,
+# streamed listings are read from MySQL stream_chunk_size rows at a time, ?ids= lookups accept at most max_ids ids
+pagination_config = {
+    'default_limit': 50,
+    'max_limit': 200,
+    'stream_chunk_size': 500,
+    'max_ids': 100
+}
+
+
+def encode_cursor(value):
+    # Cursors are opaque to clients: the last key of the page as url-safe base64 encoded JSON
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def get_page_args():
+    # Returns (after, limit) from the query string, after is None for the first page
+    limit = request.args.get('limit', default=pagination_config['default_limit'], type=int)
+    limit = max(1, min(limit, pagination_config['max_limit']))
+    cursor = request.args.get('after')
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None and not isinstance(after, int):
+        raise ValueError('Invalid cursor')
+    return after, limit
+
+
+def fetch_page(cursor, query, params, limit):
+    # Fetches one row more than requested to know whether another page exists without a COUNT(*)
+    cursor.execute(query, params + (limit + 1,))
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    return rows[:limit], has_more
+
+
+def get_id_list():
+    # Returns the ids of ?ids=3,1,2 in request order without duplicates, None when the parameter is absent
+    raw = request.args.get('ids')
+    if raw is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    except ValueError as e:
+        raise ValueError('ids must be a comma separated list of integers') from e
+    if not ids:
+        raise ValueError('ids must be a comma separated list of integers')
+    if len(ids) > pagination_config['max_ids']:
+        raise ValueError(f"At most {pagination_config['max_ids']} ids can be requested at once")
+    return ids
+
+
+def lookup_by_ids(ids, query, row_to_dict, cache=None):
+    # Serves what it can from cache and resolves the rest with one IN query on one connection, query has a
+    # {placeholders} slot and selects the id first. Returns (records in request order, ids that do not exist)
+    found = {}
+    if cache is not None:
+        for record_id in ids:
+            record = cache.get(record_id)
+            if record is not None:
+                found[record_id] = record
+    pending = [record_id for record_id in ids if record_id not in found]
+    if pending:
+        connection = create_connection()
+        cursor = connection.cursor()
+        cursor.execute(query.format(placeholders=', '.join(['%s'] * len(pending))), pending)
+        rows = cursor.fetchall()
+        cursor.close()
+        connection.close()
+        for row in rows:
+            found[row[0]] = row_to_dict(row)
+            if cache is not None:
+                cache.set(row[0], found[row[0]])
+    return [found[record_id] for record_id in ids if record_id in found], \
+        [record_id for record_id in ids if record_id not in found]
+
+
+# Bulk ingestion configuration
+# bulk endpoints write chunk_size rows per multi-row statement and transaction, clients may ask for up to max_chunk_size
+bulk_config = {
+    'chunk_size': 1000,
+    'max_chunk_size': 5000
+}
+
+
+def wants_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def stream_ndjson(connection, query, params, row_to_dict):
+    # Rows are read from the unbuffered cursor in chunks and written out one JSON document per line,
+    # so the response starts immediately and only one chunk is held in memory at a time
+    cursor = connection.cursor()
+    cursor.execute(query, params)
+    # The body is sent after the view returns and its app context is torn down, so the connection is taken off the
+    # context's list and only the generator below returns it to the pool
+    if has_app_context() and connection in g.get('pooled_connections', []):
+        g.pooled_connections.remove(connection)
+
+    def generate():
+        try:
+            while True:
+                rows = cursor.fetchmany(pagination_config['stream_chunk_size'])
+                if not rows:
+                    break
+                yield ''.join(app.json.dumps(row_to_dict(row)) + '\n' for row in rows)
+        finally:
+            # A client that disconnects mid-stream leaves unread rows behind, the pool then discards the connection
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+            connection.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# Catalog cache configuration
+# movie and genre records are kept in process for ttl seconds, each cache holds at most max_entries items
+cache_config = {
+    'max_entries': 10000,
+    'ttl': 300
+}
+
+
+class LRUCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()  # key -> (value, expires_at), least recently used first
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self.enabled = True
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations
+            }
+
+
+movie_cache = LRUCache(**cache_config)         # movie_id -> movie
+genre_cache = LRUCache(**cache_config)         # genre_id -> genre
+genre_list_cache = LRUCache(**cache_config)    # (after, limit) -> page of get_all_genres
+movie_genres_cache = LRUCache(**cache_config)  # movie_id -> genres of the movie
+
+
+# The catalog write endpoints call these after committing
+def invalidate_movie(movie_id):
+    movie_cache.pop(movie_id)
+    movie_genres_cache.pop(movie_id)
+    shared_cache.bump('catalog')
+    analytics_cache.expire_all()
+    content_index.mark_stale()
+    autocomplete.mark_stale()
+    movie_filter.mark_stale()
+    analytics_snapshot.mark_stale()
+
+
+def invalidate_movie_genres(movie_id):
+    movie_genres_cache.pop(movie_id)
+    shared_cache.bump('catalog')
+    analytics_cache.expire_all()
+    content_index.mark_stale()
+    autocomplete.mark_stale()
+    movie_filter.mark_stale()
+    analytics_snapshot.mark_stale()
+
+
+def invalidate_genres(genre_id=None):
+    # A renamed or deleted genre shows up in the genre list and in every movie's genres
+    if genre_id is not None:
+        genre_cache.pop(genre_id)
+    genre_list_cache.clear()
+    movie_genres_cache.clear()
+    shared_cache.bump('catalog')
+    analytics_cache.expire_all()
+    content_index.mark_stale()
+    autocomplete.mark_stale()
+    movie_filter.mark_stale()
+    analytics_snapshot.mark_stale()
+
+
+# Catalog changes that touch no cached record (e.g. new movies) only retire the lists and shared responses
+def invalidate_catalog():
+    genre_list_cache.clear()
+    shared_cache.bump('catalog')
+    analytics_cache.expire_all()
+    content_index.mark_stale()
+    autocomplete.mark_stale()
+    movie_filter.mark_stale()
+    analytics_snapshot.mark_stale()
+
+
+# The rating write endpoints call this after committing, with the rated movies when they are known
+def invalidate_ratings(movie_ids=None):
+    shared_cache.bump('ratings')
+    analytics_cache.expire_all()
+    movie_filter.update_ratings(None if movie_ids is None else sorted(movie_ids))
+    analytics_snapshot.mark_stale()
+
+
+# Shared cache configuration
+# when url is set (e.g. redis://localhost:6379/0) the responses of the list and analytics endpoints are cached in a
+# Redis-protocol server shared by all worker processes, entries expire after ttl seconds
+shared_cache_config = {
+    'url': None,
+    'ttl': 60,
+    'prefix': 'film_recommendation'
+}
+
+
+class SharedCache:
+    # Keys embed a version number per namespace ('catalog', 'ratings'); a write in any worker increments the version,
+    # so every worker stops reading the old entries, which then simply expire
+    def __init__(self, url, ttl, prefix):
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url) if url and redis is not None else None
+        self._errors = 0
+
+    @property
+    def enabled(self):
+        return self._client is not None
+
+    def versions(self, namespaces):
+        if not self.enabled:
+            return [0] * len(namespaces)
+        values = self._client.mget([f"{self.prefix}:version:{namespace}" for namespace in namespaces])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, namespace):
+        if not self.enabled:
+            return
+        try:
+            self._client.incr(f"{self.prefix}:version:{namespace}")
+        except redis.RedisError as e:
+            self._errors += 1
+            print(f"Error invalidating shared cache: {e}")
+
+    def get_or_compute(self, namespaces, name, params, compute):
+        # A cache outage must not fail the request, the value is then computed as if nothing was cached
+        if not self.enabled:
+            return compute()
+        try:
+            versions = self.versions(namespaces)
+            key = f"{self.prefix}:{name}:{'.'.join(map(str, versions))}:{json.dumps(params)}"
+            cached = self._client.get(key)
+        except redis.RedisError:
+            self._errors += 1
+            return compute()
+        if cached is not None:
+            return app.json.loads(cached)
+
+        value = compute()
+        try:
+            self._client.set(key, app.json.dumps(value), ex=self.ttl)
+        except redis.RedisError:
+            self._errors += 1
+        return value
+
+    def stats(self):
+        return {'enabled': self.enabled, 'ttl': self.ttl, 'errors': self._errors}
+
+
+shared_cache = SharedCache(**shared_cache_config)
+
+# The per-process catalog caches are only invalidated by this process's writes, so with several workers sharing the
+# shared tier they are switched off rather than serving another worker's stale records for up to their ttl
+if shared_cache.enabled:
+    for local_cache in (movie_cache, genre_cache, genre_list_cache, movie_genres_cache):
+        local_cache.enabled = False
+
+
+# Analytics coalescing configuration
+# concurrent identical analytics requests share one query; a result is fresh for fresh_ttl seconds, after that
+# (or after a write) it is still served for up to stale_ttl seconds while a single background refresh replaces it.
+# With numpy installed the analytics endpoints answer from the analytics snapshot instead, so this cache (and the
+# shared cache entries of those endpoints) only serve the fallback without numpy
+coalescing_config = {
+    'fresh_ttl': 5,
+    'stale_ttl': 300,
+    'max_entries': 1000
+}
+
+
+class SingleFlight:
+    # Callers asking for the same key while a call is running wait for it and share its result or error
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight.Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class StaleWhileRevalidateCache:
+    def __init__(self, fresh_ttl, stale_ttl, max_entries):
+        self.fresh_ttl = fresh_ttl
+        self._values = LRUCache(max_entries, stale_ttl)  # key -> (value, computed_at, generation)
+        self._flight = SingleFlight()
+        self._generation = 0
+        self._stale_hits = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+
+    def expire_all(self):
+        # Entries computed before a write become stale: still served, but refreshed on their next read
+        self._generation += 1
+
+    def get(self, key, compute):
+        entry = self._values.get(key)
+        if entry is None:
+            return self._load(key, compute)
+        value, computed_at, generation = entry
+        if generation != self._generation or time.monotonic() - computed_at >= self.fresh_ttl:
+            self._stale_hits += 1
+            if not self._flight.in_flight(key):
+                threading.Thread(target=self._refresh, args=(key, compute), daemon=True).start()
+        return value
+
+    def _load(self, key, compute):
+        def run():
+            generation = self._generation
+            value = compute()
+            self._values.set(key, (value, time.monotonic(), generation))
+            return value
+        return self._flight.do(key, run)
+
+    def _refresh(self, key, compute):
+        self._refreshes += 1
+        try:
+            with app.app_context():
+                self._load(key, compute)
+        except Exception as e:
+            self._refresh_errors += 1
+            print(f"Error refreshing {key}: {e}")
+
+    def stats(self):
+        stats = self._values.stats()
+        stats.update({
+            'fresh_ttl': self.fresh_ttl,
+            'stale_hits': self._stale_hits,
+            'coalesced': self._flight.coalesced,
+            'refreshes': self._refreshes,
+            'refresh_errors': self._refresh_errors
+        })
+        return stats
+
+
+analytics_cache = StaleWhileRevalidateCache(**coalescing_config)
+
+
+# Watch history ingestion configuration
+# mode 'direct' inserts every event in its own request; 'buffered' queues events for a background thread that writes
+# them in batches once flush_size events are waiting or every flush_interval seconds. With durability 'buffer' the
+# request returns as soon as the event is queued (and appended to journal_path when set, so queued events survive a
+# crash and are replayed at startup), with 'commit' it waits up to ack_timeout seconds for its batch to commit.
+# Buffered events show up in watch_history (and in add_recommendation's watched check) only after their flush.
+watch_history_config = {
+    'mode': 'direct',
+    'durability': 'commit',
+    'flush_size': 500,
+    'flush_interval': 1.0,
+    'max_queue': 100000,
+    'ack_timeout': 30,
+    'journal_path': None
+}
+
+
+class WatchHistoryBuffer:
+    class Event:
+        def __init__(self, user_id, movie_id):
+            self.row = (user_id, movie_id)
+            self.done = threading.Event()
+            self.error = None
+
+    def __init__(self, flush_size, flush_interval, max_queue, journal_path):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.journal_path = journal_path
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._journal = None
+        self._stopping = False
+        self._enqueued = 0
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._failed_rows = 0
+        self._flush_time_total = 0.0
+        self._last_flush_ms = 0.0
+        self._max_depth = 0
+
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._start()
+
+    def _start(self):
+        # Called with the condition held, replaying what a previous process left in the journal
+        if self.journal_path:
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path) as journal:
+                    for line in journal:
+                        if line.strip():
+                            event = json.loads(line)
+                            self._queue.append(WatchHistoryBuffer.Event(event['user_id'], event['movie_id']))
+            self._journal = open(self.journal_path, 'a')
+        self._thread = threading.Thread(target=self._run, name='watch-history-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def add(self, user_id, movie_id):
+        with self._condition:
+            if self._thread is None:
+                self._start()
+            if len(self._queue) >= self.max_queue:
+                raise queue.Full('Watch history buffer is full')
+            event = WatchHistoryBuffer.Event(user_id, movie_id)
+            if self._journal is not None:
+                self._journal.write(json.dumps({'user_id': user_id, 'movie_id': movie_id}) + '\n')
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._queue.append(event)
+            self._enqueued += 1
+            self._max_depth = max(self._max_depth, len(self._queue))
+            if len(self._queue) >= self.flush_size:
+                self._condition.notify()
+        return event
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 10)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._stopping or len(self._queue) >= self.flush_size,
+                                         timeout=self.flush_interval)
+                batch = list(self._queue)
+                self._queue.clear()
+                stopping = self._stopping
+            try:
+                if batch:
+                    self._flush(batch)
+            except Exception as e:
+                # The flusher must survive anything; events that were not acknowledged go back to the queue
+                print(f"Error flushing watch history: {e}")
+                with self._condition:
+                    self._queue.extendleft(reversed([event for event in batch if not event.done.is_set()]))
+            if stopping:
+                return
+
+    @staticmethod
+    def _rollback(connection):
+        try:
+            connection.rollback()
+        except mysql.connector.Error:
+            pass
+
+    @staticmethod
+    def _connection_lost(error, connection):
+        # 2006: server has gone away, 2013: lost connection during query
+        if error.errno in (2006, 2013):
+            return True
+        try:
+            return not connection.is_connected()
+        except mysql.connector.Error:
+            return True
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        try:
+            connection = connection_pool.acquire()
+        except mysql.connector.Error as e:
+            # The database is unreachable, keep the events (in order) for the next attempt
+            print(f"Error flushing watch history: {e}")
+            with self._condition:
+                self._queue.extendleft(reversed(batch))
+            return
+
+        # Events are handled in order, so batch[:handled] is committed or rejected and the rest can be retried
+        failed = 0
+        handled = 0
+        try:
+            cursor = connection.cursor()
+            query = "INSERT INTO watch_history (user_id, movie_id) VALUES (%s, %s)"
+            for start in range(0, len(batch), self.flush_size):
+                chunk = batch[start:start + self.flush_size]
+                try:
+                    cursor.executemany(query, [event.row for event in chunk])
+                    mark_similarity_dirty(cursor, [event.row[1] for event in chunk])
+                    connection.commit()
+                except mysql.connector.Error as e:
+                    self._rollback(connection)
+                    if self._connection_lost(e, connection):
+                        raise
+                    # One bad row (e.g. an unknown movie) fails the statement, retry the chunk row by row to isolate it
+                    for event in chunk:
+                        try:
+                            cursor.execute(query, event.row)
+                            mark_similarity_dirty(cursor, [event.row[1]])
+                            connection.commit()
+                        except mysql.connector.Error as e:
+                            self._rollback(connection)
+                            if self._connection_lost(e, connection):
+                                raise
+                            event.error = e
+                            failed += 1
+                        event.done.set()
+                        handled += 1
+                    continue
+                for event in chunk:
+                    event.done.set()
+                handled += len(chunk)
+            cursor.close()
+        except mysql.connector.Error as e:
+            # The connection dropped: keep the events that were not handled (in order) for the next attempt
+            print(f"Error flushing watch history: {e}")
+            with self._condition:
+                self._queue.extendleft(reversed(batch[handled:]))
+        finally:
+            connection.close()
+
+        elapsed = time.monotonic() - started
+        with self._condition:
+            self._flushes += 1
+            self._flushed_rows += handled - failed
+            self._failed_rows += failed
+            self._flush_time_total += elapsed
+            self._last_flush_ms = elapsed * 1000
+            if self._journal is not None:
+                self._rewrite_journal()
+
+    def _rewrite_journal(self):
+        # Called with the condition held: the journal is replaced by the events that are still queued.
+        # A crash between the commit and this point replays the batch, so delivery is at-least-once.
+        temporary_path = self.journal_path + '.tmp'
+        with open(temporary_path, 'w') as journal:
+            for event in self._queue:
+                journal.write(json.dumps({'user_id': event.row[0], 'movie_id': event.row[1]}) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._journal.close()
+        os.replace(temporary_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a')
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self._max_depth,
+                'enqueued': self._enqueued,
+                'flushes': self._flushes,
+                'flushed_rows': self._flushed_rows,
+                'failed_rows': self._failed_rows,
+                'last_flush_ms': round(self._last_flush_ms, 3),
+                'avg_flush_ms': round(self._flush_time_total / self._flushes * 1000, 3) if self._flushes else 0.0
+            }
+
+
+watch_history_buffer = WatchHistoryBuffer(
+    flush_size=watch_history_config['flush_size'],
+    flush_interval=watch_history_config['flush_interval'],
+    max_queue=watch_history_config['max_queue'],
+    journal_path=watch_history_config['journal_path']
+)
+
+# In buffered mode the journal a previous process left behind is replayed as soon as the app starts
+if watch_history_config['mode'] == 'buffered':
+    watch_history_buffer.start()
+
+# Recommender configuration
+# train-recommender factorizes the user x movie rating matrix into `factors` latent factors with `iterations` rounds
+# of alternating least squares (L2 penalty `regularization`) and saves the model to model_path, which the endpoints
+# reload whenever the file changes. With evaluation on, `holdout` of the ratings are hidden from a first model and
+# recall@top_k is measured on the hidden ratings of at least relevant_score. Each round solves its rows in batches
+# of about solve_chunk ratings, which bounds the (ratings, factors, factors) array the Gram matrices are summed from
+recommender_config = {
+    'factors': 32,
+    'iterations': 10,
+    'regularization': 0.1,
+    'solve_chunk': 4096,
+    'top_k': 10,
+    'holdout': 0.2,
+    'relevant_score': 4.0,
+    'seed': 42,
+    'model_path': 'recommender_model.npz'
+}
+
+
+def id_rows(ids, known_ids):
+    # Positions of ids in the sorted array known_ids, -1 for ids it does not contain
+    ids = np.asarray(ids, dtype=known_ids.dtype)
+    if not len(known_ids):
+        return np.full(len(ids), -1)
+    positions = np.searchsorted(known_ids, ids)
+    positions[positions == len(known_ids)] = 0
+    return np.where(known_ids[positions] == ids, positions, -1)
+
+
+class RatingFactorization:
+    # Explicit-feedback matrix factorization: a score is predicted as mean + user_factors[u] . movie_factors[m].
+    # user_ids and movie_ids are sorted, so an id's row is found with a binary search. model_id is a hash of the
+    # ids and factors, which indexes built from the model record to tell whether they still match it
+    def __init__(self, user_ids, movie_ids, user_factors, movie_factors, mean, info=None):
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.user_factors = user_factors
+        self.movie_factors = movie_factors
+        self.mean = float(mean)
+        self.info = info or {}
+        digest = hashlib.sha256()
+        for array in (user_ids, movie_ids, user_factors, movie_factors):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        self.model_id = digest.hexdigest()
+
+    @classmethod
+    def train(cls, user_ids, movie_ids, scores, factors, iterations, regularization, seed, solve_chunk):
+        users, user_rows = np.unique(user_ids, return_inverse=True)
+        movies, movie_rows = np.unique(movie_ids, return_inverse=True)
+        mean = scores.mean()
+        ratings = scipy.sparse.csr_matrix((scores - mean, (user_rows, movie_rows)), shape=(len(users), len(movies)))
+        ratings_by_movie = ratings.T.tocsr()
+
+        random = np.random.default_rng(seed)
+        user_factors = random.normal(0, 0.1, (len(users), factors))
+        movie_factors = random.normal(0, 0.1, (len(movies), factors))
+        for _ in range(iterations):
+            cls._solve(ratings, movie_factors, user_factors, regularization, solve_chunk)
+            cls._solve(ratings_by_movie, user_factors, movie_factors, regularization, solve_chunk)
+        return cls(users, movies, user_factors.astype(np.float32), movie_factors.astype(np.float32), mean)
+
+    @staticmethod
+    def _solve(ratings, fixed, target, regularization, chunk_size):
+        # Each row's factors are the ridge regression of its ratings on the other side's factors, the
+        # right-hand sides of all rows come from one sparse product. Rows with ratings are taken in runs of about
+        # chunk_size ratings: their Gram matrices are summed from per-rating outer products with reduceat and the
+        # (rows, k, k) stack goes to a single batched solve. Rows without ratings keep their factors
+        right_hand_sides = ratings @ fixed
+        identity = np.eye(fixed.shape[1])
+        counts = np.diff(ratings.indptr)
+        rows = np.flatnonzero(counts)
+        ends = np.cumsum(counts[rows])
+        start = 0
+        while start < len(rows):
+            done = ends[start - 1] if start else 0
+            end = max(start + 1, int(np.searchsorted(ends, done + chunk_size, side='right')))
+            chunk = rows[start:end]
+            offsets = ratings.indptr[chunk] - ratings.indptr[chunk[0]]
+            rated = fixed[ratings.indices[ratings.indptr[chunk[0]]:ratings.indptr[chunk[-1] + 1]]]
+            grams = np.add.reduceat(rated[:, :, None] * rated[:, None, :], offsets, axis=0)
+            grams += regularization * counts[chunk][:, None, None] * identity
+            target[chunk] = np.linalg.solve(grams, right_hand_sides[chunk][:, :, None])[:, :, 0]
+            start = end
+
+    def recommend(self, user_id, exclude, k):
+        # Returns [(movie_id, predicted score)] best first, None when the user had no ratings at training time
+        row = id_rows([user_id], self.user_ids)[0]
+        if row < 0:
+            return None
+        scores = self.mean + self.movie_factors @ self.user_factors[row]
+        if exclude:
+            scores[np.isin(self.movie_ids, list(exclude))] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in best]
+
+    def save(self, path):
+        # Written next to the old model and swapped in, so a reader never loads a half-written file
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as model_file:
+            np.savez(model_file, user_ids=self.user_ids, movie_ids=self.movie_ids, user_factors=self.user_factors,
+                     movie_factors=self.movie_factors, mean=self.mean, info=json.dumps(self.info))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model_file:
+            return cls(model_file['user_ids'], model_file['movie_ids'], model_file['user_factors'],
+                       model_file['movie_factors'], model_file['mean'], json.loads(str(model_file['info'])))
+
+
+def load_rating_arrays(cursor):
+    # Users who rated a movie more than once count with their average score
+    cursor.execute("SELECT user_id, movie_id, AVG(score) FROM rating GROUP BY user_id, movie_id")
+    user_ids, movie_ids, scores = [], [], []
+    while True:
+        rows = cursor.fetchmany(pagination_config['stream_chunk_size'])
+        if not rows:
+            break
+        for user_id, movie_id, score in rows:
+            user_ids.append(user_id)
+            movie_ids.append(movie_id)
+            scores.append(float(score))
+    return np.array(user_ids, dtype=np.int64), np.array(movie_ids, dtype=np.int64), np.array(scores)
+
+
+def recall_at_k(user_ids, movie_ids, scores, config):
+    # Trains on all but the held-out ratings and measures, per user with relevant held-out movies, which share of
+    # them shows up in the top k of the movies the user did not rate in training. Returns (mean recall, users)
+    held_out = np.random.default_rng(config['seed']).random(len(scores)) < config['holdout']
+    model = RatingFactorization.train(user_ids[~held_out], movie_ids[~held_out], scores[~held_out],
+                                      config['factors'], config['iterations'], config['regularization'], config['seed'],
+                                      config['solve_chunk'])
+    shape = (len(model.user_ids), len(model.movie_ids))
+    seen = scipy.sparse.csr_matrix((np.ones(int((~held_out).sum())), (
+        id_rows(user_ids[~held_out], model.user_ids), id_rows(movie_ids[~held_out], model.movie_ids))),
+        shape=shape)
+
+    user_rows = id_rows(user_ids, model.user_ids)
+    movie_rows = id_rows(movie_ids, model.movie_ids)
+    relevant_mask = held_out & (scores >= config['relevant_score']) & (user_rows >= 0) & (movie_rows >= 0)
+    relevant = scipy.sparse.csr_matrix((np.ones(int(relevant_mask.sum())), (
+        user_rows[relevant_mask], movie_rows[relevant_mask])), shape=shape)
+    evaluated_users = np.flatnonzero(np.diff(relevant.indptr))
+    k = min(config['top_k'], shape[1])
+    if not len(evaluated_users) or k == 0:
+        return None, 0
+
+    recalls = []
+    for start in range(0, len(evaluated_users), 1024):
+        block = evaluated_users[start:start + 1024]
+        predicted = model.user_factors[block] @ model.movie_factors.T
+        predicted[seen[block].toarray() > 0] = -np.inf
+        top = np.argpartition(-predicted, k - 1, axis=1)[:, :k]
+        wanted = relevant[block].toarray()
+        hits = np.take_along_axis(wanted, top, axis=1).sum(axis=1)
+        recalls.append(hits / wanted.sum(axis=1))
+    return float(np.concatenate(recalls).mean()), len(evaluated_users)
+
+
+class ModelFile:
+    # Models are built by CLI commands in another process, so the file is reloaded whenever its mtime changes
+    def __init__(self, path, load):
+        self.path = path
+        self.load = load
+        self._model = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                self._model = self.load(self.path)
+                self._mtime = mtime
+            return self._model
+
+
+recommender_model = ModelFile(recommender_config['model_path'], RatingFactorization.load)
+
+# Batch recommendation configuration
+# generate-recommendations scores users in chunks of batch_users on `workers` processes (None: one per CPU core)
+# and replaces each user's recommendation rows with their top_k unseen movies
+batch_recommendation_config = {
+    'workers': None,
+    'batch_users': 1000,
+    'top_k': 10
+}
+
+# Arrays the batch job shares with its worker processes, attached once per worker as name -> (memory, array)
+shared_arrays = {}
+
+
+def share_array(name, array):
+    # Copies array into a new shared memory block, workers map the same block by its name without copying
+    array = np.ascontiguousarray(array)
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    shared_arrays[name] = (memory, array)
+    return name, memory.name, array.shape, array.dtype.str
+
+
+def attach_shared_arrays(specs, mean):
+    for name, memory_name, shape, dtype in specs:
+        memory = shared_memory.SharedMemory(name=memory_name)
+        shared_arrays[name] = (memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+    shared_arrays['mean'] = (None, mean)
+
+
+def recommend_user_range(start, end, k):
+    # Runs in a worker: scores users [start, end) against every movie, drops movies the user has seen (the seen
+    # matrix is CSR over user rows) and movies deleted since training, and returns (user ids, top k movie ids)
+    # with -1 where fewer than k movies were left
+    array = {name: value for name, (_, value) in shared_arrays.items()}
+    scores = array['mean'] + array['user_factors'][start:end] @ array['movie_factors'].T
+    scores[:, ~array['movie_exists']] = -np.inf
+    indptr = array['seen_indptr']
+    for row in range(start, end):
+        scores[row - start, array['seen_indices'][indptr[row]:indptr[row + 1]]] = -np.inf
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best = np.take_along_axis(best, np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1), axis=1)
+    movies = np.where(np.isfinite(np.take_along_axis(scores, best, axis=1)), array['movie_ids'][best], -1)
+    return array['user_ids'][start:end], movies
+
+
+# Item similarity configuration
+# rebuild-similarity keeps the `neighbors` most similar movies of every movie in movie_similarity. Similarity is
+# (1 - co_watch_weight) * adjusted cosine of the rating vectors + co_watch_weight * cosine of the watch vectors,
+# computed block_size movies at a time as sparse products, so a block costs memory in proportion to the pairs that
+# share a rater or watcher rather than to block_size x catalog size. Rating, watch history and user deletions mark
+# the movies they touch dirty for the next rebuild-similarity
+similarity_config = {
+    'neighbors': 20,
+    'co_watch_weight': 0.3,
+    'block_size': 256
+}
+
+
+def mark_similarity_dirty(cursor, movie_ids):
+    # Called in the rating or watch history write's transaction, the next rebuild-similarity recomputes these
+    # movies' neighbors
+    chunked_executemany(cursor, """
+        INSERT INTO similarity_dirty_movie (movie_id) VALUES (%s)
+        ON DUPLICATE KEY UPDATE marked_at = CURRENT_TIMESTAMP(6)
+    """, [(movie_id,) for movie_id in sorted(set(movie_ids))])
+
+
+class SimilarityVectors:
+    # Unit-length movie columns: ratings centered on each user's mean (adjusted cosine) and binary watch vectors
+    def __init__(self, movie_ids, ratings, watches, watch_counts):
+        self.movie_ids = movie_ids
+        self.ratings = ratings
+        self.watches = watches
+        self.watch_counts = watch_counts
+
+    @classmethod
+    def load(cls, cursor):
+        user_ids, rated_movie_ids, scores = load_rating_arrays(cursor)
+        cursor.execute("SELECT DISTINCT user_id, movie_id FROM watch_history")
+        watched = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        movie_ids = np.union1d(rated_movie_ids, watched[:, 1])
+
+        users, user_rows = np.unique(user_ids, return_inverse=True)
+        user_means = np.bincount(user_rows, weights=scores) / np.maximum(np.bincount(user_rows), 1)
+        ratings = scipy.sparse.csc_matrix(
+            (scores - user_means[user_rows], (user_rows, np.searchsorted(movie_ids, rated_movie_ids))),
+            shape=(len(users), len(movie_ids)))
+        norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0))).ravel()
+        ratings = (ratings @ scipy.sparse.diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0))).tocsc()
+
+        watchers, watcher_rows = np.unique(watched[:, 0], return_inverse=True)
+        watches = scipy.sparse.csc_matrix(
+            (np.ones(len(watched)), (watcher_rows, np.searchsorted(movie_ids, watched[:, 1]))),
+            shape=(len(watchers), len(movie_ids)))
+        watch_counts = np.asarray(watches.sum(axis=0)).ravel()
+        return cls(movie_ids, ratings, watches, watch_counts)
+
+    def neighbors(self, movie_ids):
+        # Returns movie_similarity rows (movie_id, rank, similar_movie_id, similarity, rating_similarity, co_watch_count)
+        # for the given movies, only positively similar movies are kept
+        columns = id_rows(movie_ids, self.movie_ids)
+        columns = columns[columns >= 0]
+        weight = similarity_config['co_watch_weight']
+        size = similarity_config['neighbors']
+        rows = []
+        for start in range(0, len(columns), similarity_config['block_size']):
+            block = columns[start:start + similarity_config['block_size']]
+            rating_similarity = (self.ratings[:, block].T @ self.ratings).tocsr()
+            co_watch = (self.watches[:, block].T @ self.watches).tocsr()
+            co_watch.sort_indices()
+            watch_similarity = co_watch.copy()
+            watch_rows = np.repeat(np.arange(len(block)), np.diff(co_watch.indptr))
+            watch_similarity.data = co_watch.data / np.sqrt(
+                self.watch_counts[block][watch_rows] * self.watch_counts[co_watch.indices])
+            similarity = ((1 - weight) * rating_similarity + weight * watch_similarity).tocsr()
+            similarity.sort_indices()
+            rating_similarity.sort_indices()
+            for row, column in enumerate(block):
+                # Only the stored entries of the row can be positive, the top ones are picked among them
+                row_start, row_end = similarity.indptr[row], similarity.indptr[row + 1]
+                others = similarity.indices[row_start:row_end]
+                values = similarity.data[row_start:row_end]
+                keep = (values > 0) & (others != column)
+                others, values = others[keep], values[keep]
+                if len(others) > size:
+                    best = np.argpartition(-values, size - 1)[:size]
+                    others, values = others[best], values[best]
+                order = np.argsort(-values, kind='stable')
+                others, values = others[order], values[order]
+                rows.extend((int(self.movie_ids[column]), rank, int(self.movie_ids[other]), float(value),
+                             float(rating_value), int(co_watch_count))
+                            for rank, (other, value, rating_value, co_watch_count) in enumerate(zip(
+                                others, values, self._row_values(rating_similarity, row, others),
+                                self._row_values(co_watch, row, others)), start=1))
+        return rows
+
+    @staticmethod
+    def _row_values(matrix, row, columns):
+        # matrix[row, columns] of a CSR matrix with sorted indices, 0 where nothing is stored
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        indices = matrix.indices[start:end]
+        if not len(indices):
+            return np.zeros(len(columns))
+        positions = np.minimum(np.searchsorted(indices, columns), len(indices) - 1)
+        return np.where(indices[positions] == columns, matrix.data[start + positions], 0)
+
+
+class BackgroundIndex:
+    # Base of the in-memory indexes that are rebuilt from the database by _build(): the first use builds inline,
+    # afterwards a change (mark_stale) or an index older than max_age starts a background rebuild while the
+    # previous index keeps answering
+    name = 'index'
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = None
+        self._stale = False
+        self._rebuilding = False
+        self._builds = 0
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _rebuild(self):
+        try:
+            with app.app_context():
+                index = self._build()
+            with self._lock:
+                self._index = index
+                self._built_at = time.monotonic()
+                self._builds += 1
+        except Exception as e:
+            print(f"Error rebuilding {self.name}: {e}")
+        finally:
+            self._rebuilding = False
+
+    def _current(self):
+        with self._lock:
+            if self._index is None:
+                self._stale = False
+                self._index = self._build()
+                self._built_at = time.monotonic()
+                self._builds += 1
+            elif (self._stale or self._expired()) and not self._rebuilding:
+                self._stale = False
+                self._rebuilding = True
+                threading.Thread(target=self._rebuild, daemon=True).start()
+            return self._index
+
+    def _expired(self):
+        return time.monotonic() - self._built_at > self.max_age
+
+    def age(self):
+        return round(time.monotonic() - self._built_at, 3) if self._built_at is not None else None
+
+
+# Content recommender configuration
+# movies are vectorized from their title and description (word unigrams and bigrams hashed into hash_features
+# TF-IDF weighted buckets) and their genres, genre_weight is the genres' share of the similarity. The vectors are
+# a sparse float32 matrix, rebuilt in the background after a catalog change in this process and every max_age seconds
+content_config = {
+    'hash_features': 1024,
+    'genre_weight': 0.5,
+    'max_age': 300
+}
+
+
+class ContentIndex(BackgroundIndex):
+    # The index is (movie_ids, sparse float32 matrix of unit rows, idf per bucket, genre name -> column)
+    name = 'content index'
+
+    def __init__(self, hash_features, genre_weight, max_age):
+        super().__init__(max_age)
+        self.hash_features = hash_features
+        self.genre_weight = genre_weight
+
+    @staticmethod
+    def words(text):
+        return re.findall(r'[a-z0-9]+', (text or '').lower())
+
+    @classmethod
+    def tokens(cls, text):
+        words = cls.words(text)
+        return words + [first + ' ' + second for first, second in zip(words, words[1:])]
+
+    def _buckets(self, tokens):
+        # crc32 rather than hash(), which is salted per process
+        return [zlib.crc32(token.encode('utf-8')) % self.hash_features for token in tokens]
+
+    def _build(self):
+        connection = create_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT movie_id, title, description FROM movie ORDER BY movie_id")
+        movies = cursor.fetchall()
+        cursor.execute("SELECT mg.movie_id, g.genre_name FROM movie_genre mg JOIN genre g ON mg.genre_id = g.genre_id")
+        memberships = cursor.fetchall()
+        cursor.close()
+        connection.close()
+
+        movie_ids = np.array([movie[0] for movie in movies], dtype=np.int64)
+        rows, buckets = [], []
+        for row, (_, title, description) in enumerate(movies):
+            movie_buckets = self._buckets(self.tokens(f"{title} {description or ''}"))
+            rows.extend([row] * len(movie_buckets))
+            buckets.extend(movie_buckets)
+        counts = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, buckets)),
+                                         shape=(len(movies), self.hash_features))
+        document_frequency = np.bincount(counts.indices, minlength=self.hash_features)
+        idf = (np.log((1 + len(movies)) / (1 + document_frequency)) + 1).astype(np.float32)
+        counts.data = np.log1p(counts.data)
+        text = counts @ scipy.sparse.diags(idf)
+
+        names = [' '.join(self.words(genre_name)) for _, genre_name in memberships]
+        genre_columns = {name: column for column, name in enumerate(dict.fromkeys(names))}
+        rows = id_rows([movie_id for movie_id, _ in memberships], movie_ids)
+        known = rows >= 0
+        genres = scipy.sparse.csr_matrix(
+            (np.ones(int(known.sum()), dtype=np.float32),
+             (rows[known], [genre_columns[name] for name, row in zip(names, rows) if row >= 0])),
+            shape=(len(movies), len(genre_columns)))
+        genres.data[:] = 1  # a genre listed twice for a movie still counts once
+
+        return movie_ids, self._combine(text, genres), idf, genre_columns
+
+    def _combine(self, text, genres):
+        # Both parts are scaled to unit length and weighted so that a dot product of two rows is
+        # (1 - genre_weight) * text cosine + genre_weight * genre cosine
+        def unit(matrix):
+            matrix = scipy.sparse.csr_matrix(matrix, dtype=np.float32)
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float32).ravel())
+            return scipy.sparse.diags(np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)) @ matrix
+        return scipy.sparse.hstack([np.sqrt(1 - self.genre_weight) * unit(text),
+                                    np.sqrt(self.genre_weight) * unit(genres)], format='csr', dtype=np.float32)
+
+    def recommend(self, seed_movie_ids, text, exclude, k):
+        # Returns [(movie_id, similarity)] for the movies closest to the mean of the seed movies' vectors and the
+        # vector of text (a user's preferences, genre names in it count as genres), best first
+        movie_ids, matrix, idf, genre_columns = self._current()
+        profile = np.zeros(matrix.shape[1], dtype=np.float32)
+        seeds = id_rows(seed_movie_ids, movie_ids)
+        seeds = seeds[seeds >= 0]
+        if len(seeds):
+            profile += np.asarray(matrix[seeds].mean(axis=0)).ravel()
+        if text:
+            text_vector = np.zeros((1, self.hash_features), dtype=np.float32)
+            np.add.at(text_vector[0], self._buckets(self.tokens(text)), 1)
+            text_vector = np.log1p(text_vector) * idf
+            words = ' ' + ' '.join(self.words(text)) + ' '
+            genre_vector = np.zeros((1, len(genre_columns)), dtype=np.float32)
+            for genre_name, column in genre_columns.items():
+                if ' ' + genre_name + ' ' in words:
+                    genre_vector[0, column] = 1
+            profile += self._combine(text_vector, genre_vector).toarray()[0]
+        if not profile.any():
+            return []
+
+        scores = matrix @ profile
+        if exclude:
+            scores[np.isin(movie_ids, list(exclude))] = -np.inf
+        scores[scores <= 0] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(movie_ids[i]), float(scores[i])) for i in best]
+
+    def stats(self):
+        vectors = self._index
+        matrix = vectors[1] if vectors else None
+        return {
+            'movies': len(vectors[0]) if vectors else 0,
+            'features': matrix.shape[1] if vectors else 0,
+            'matrix_bytes': matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes if vectors else 0,
+            'builds': self._builds,
+            'stale': self._stale
+        }
+
+
+content_index = ContentIndex(**content_config)
+
+def write_array_files(directory, arrays, info):
+    # Each build writes new .npy files and then swaps manifest.json, so a process that still has the previous files
+    # mapped keeps reading a consistent set. Files older than both the new and the replaced build are removed, which
+    # keeps a build that finishes concurrently in another process intact
+    os.makedirs(directory, exist_ok=True)
+    version = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d%H%M%S%f')
+    files = {}
+    for name, array in arrays.items():
+        files[name] = f"{version}-{os.getpid()}-{name}.npy"
+        np.save(os.path.join(directory, files[name]), array)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    keep_from = version
+    try:
+        with open(manifest_path) as manifest:
+            keep_from = min(keep_from, min(name.split('-')[0] for name in json.load(manifest)['files'].values()))
+    except (OSError, ValueError, KeyError):
+        pass
+    with open(manifest_path + f'.{os.getpid()}.tmp', 'w') as manifest:
+        json.dump({'files': files, 'info': info}, manifest)
+    os.replace(manifest_path + f'.{os.getpid()}.tmp', manifest_path)
+    for name in os.listdir(directory):
+        if name.endswith('.npy') and name.split('-')[0] < keep_from:
+            os.remove(os.path.join(directory, name))
+
+
+def read_array_files(manifest_path):
+    # Returns ({name: memory-mapped array}, info) of the build manifest_path points to
+    with open(manifest_path) as manifest:
+        manifest = json.load(manifest)
+    directory = os.path.dirname(manifest_path)
+    arrays = {name: np.load(os.path.join(directory, file_name), mmap_mode='r')
+              for name, file_name in manifest['files'].items()}
+    return arrays, manifest['info']
+
+
+# Approximate nearest-neighbour index configuration
+# build-ann-index clusters the recommender's movie factors into `lists` inverted lists (None: the square root of the
+# number of movies) with kmeans_iterations rounds of k-means and writes them to index_dir as .npy files that the
+# endpoint memory-maps. A query scans the nprobe lists closest to the user, more lists trade latency for recall
+ann_config = {
+    'index_dir': 'ann_index',
+    'lists': None,
+    'nprobe': 8,
+    'kmeans_iterations': 10,
+    'seed': 42
+}
+
+
+class IVFIndex:
+    # Inverted-file index for maximum inner product search. Every vector gets one extra component that brings all of
+    # them to the same norm, so the largest inner product is also the nearest neighbour and k-means clusters apply;
+    # the vectors are stored grouped by cluster, offsets[i]:offsets[i + 1] being cluster i
+    arrays = ('centroids', 'offsets', 'vectors', 'movie_ids')
+
+    def __init__(self, centroids, offsets, vectors, movie_ids, info):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.movie_ids = movie_ids
+        self.info = info
+
+    @classmethod
+    def build(cls, movie_ids, movie_factors, lists, iterations, seed):
+        norms = np.linalg.norm(movie_factors, axis=1)
+        padding = np.sqrt(np.maximum(norms.max() ** 2 - norms ** 2, 0))
+        vectors = np.hstack([movie_factors, padding[:, None]]).astype(np.float32)
+        lists = max(1, min(lists or int(np.sqrt(len(vectors))), len(vectors)))
+
+        random = np.random.default_rng(seed)
+        centroids = vectors[random.choice(len(vectors), lists, replace=False)]
+        for _ in range(iterations):
+            assignment = cls._assign(vectors, centroids)
+            sizes = np.bincount(assignment, minlength=lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            filled = sizes > 0
+            centroids[filled] = sums[filled] / sizes[filled, None]
+
+        # The lists are filled against the final centroids, which is also the only assignment with no iterations
+        assignment = cls._assign(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+        return cls(centroids, offsets, vectors[order], movie_ids[order], {'lists': lists, 'movies': len(vectors)})
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        # With equal-norm vectors the nearest centroid maximizes x . c - |c|^2 / 2
+        return np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+
+    def search(self, user_vector, k, nprobe, exclude=None):
+        # Returns ([(movie_id, inner product)] best first, number of vectors scanned)
+        query = np.append(user_vector, 0).astype(np.float32)
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in probed])
+        scores = self.vectors[candidates] @ query
+        if exclude:
+            scores[np.isin(self.movie_ids[candidates], list(exclude))] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return [], len(candidates)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.movie_ids[candidates[i]]), float(scores[i])) for i in best], len(candidates)
+
+    def save(self, directory):
+        write_array_files(directory, {name: getattr(self, name) for name in self.arrays}, self.info)
+
+    @classmethod
+    def load(cls, manifest_path):
+        arrays, info = read_array_files(manifest_path)
+        return cls(*(arrays[name] for name in cls.arrays), info)
+
+
+ann_index = ModelFile(os.path.join(ann_config['index_dir'], 'manifest.json'), IVFIndex.load)
+
+# The model and the index (memory-mapped) are loaded when the app starts, so the first recommendation request does
+# not pay for it; files rebuilt later are picked up by their mtime
+if np is not None:
+    try:
+        recommender_model.get()
+        ann_index.get()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading the recommender model or nearest-neighbour index: {e}")
+
+# Movie search configuration
+# BM25 parameters k1 (term frequency saturation) and b (length normalization); title words count title_boost times.
+# The index is built from the movie table on the first search and kept current by this process's movie writes; an
+# index older than max_age seconds is rebuilt in the background to pick up writes made by other processes
+search_config = {
+    'k1': 1.2,
+    'b': 0.75,
+    'title_boost': 3,
+    'max_age': 300
+}
+
+search_stop_words = frozenset(
+    'a an and are as at be by for from has he her his in is it its of on or she that the their they this to was '
+    'were with who will'.split())
+
+
+class SearchIndex(BackgroundIndex):
+    # Inverted index: 'postings' maps term -> {movie_id: weighted term frequency}, 'documents' holds each movie's terms
+    # (for removal) and length. Movie writes in this process update it in place under the lock, which searches hold
+    # while scoring; writes by other processes are picked up by the rebuild every max_age seconds
+    name = 'search index'
+
+    def __init__(self, k1, b, title_boost, max_age):
+        super().__init__(max_age)
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self._pending = {}  # movie_id -> (title, description), None when removed, written while a rebuild was reading
+        self._queries = 0
+        self._query_time_total = 0.0
+        self._last_query_ms = 0.0
+
+    @staticmethod
+    def stem(word):
+        # A light suffix stripper so that e.g. run/runs/running, story/stories and love/loved/lovely meet
+        if len(word) <= 3 or word.isdigit():
+            return word
+        if word.endswith('sses'):
+            word = word[:-2]
+        elif word.endswith('ies'):
+            word = word[:-2]
+        elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        for suffix in ('ing', 'ed', 'ly'):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3 and re.search('[aeiouy]', word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if suffix != 'ly' and word[-1] == word[-2] and word[-1] not in 'lsz':
+                    word = word[:-1]
+                break
+        if word.endswith('y') and len(word) > 3 and word[-2] not in 'aeiou':
+            word = word[:-1] + 'i'
+        elif word.endswith('e') and len(word) > 3:
+            word = word[:-1]
+        return word
+
+    @classmethod
+    def analyze(cls, text):
+        return [cls.stem(word) for word in re.findall(r'[a-z0-9]+', (text or '').lower())
+                if word not in search_stop_words]
+
+    def _build(self):
+        connection = create_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT movie_id, title, description FROM movie")
+        movies = cursor.fetchall()
+        cursor.close()
+        connection.close()
+        index = {'postings': {}, 'documents': {}, 'total_length': 0}
+        for movie_id, title, description in movies:
+            self._add(index, movie_id, title, description)
+        return index
+
+    def _add(self, index, movie_id, title, description):
+        frequencies = collections.Counter(self.analyze(description))
+        for term in self.analyze(title):
+            frequencies[term] += self.title_boost
+        length = sum(frequencies.values())
+        for term, frequency in frequencies.items():
+            index['postings'].setdefault(term, {})[movie_id] = frequency
+        index['documents'][movie_id] = (tuple(frequencies), length)
+        index['total_length'] += length
+
+    def _remove(self, index, movie_id):
+        terms, length = index['documents'].pop(movie_id, ((), 0))
+        for term in terms:
+            postings = index['postings'][term]
+            del postings[movie_id]
+            if not postings:
+                del index['postings'][term]
+        index['total_length'] -= length
+
+    def _rebuild(self):
+        super()._rebuild()
+        # The new index may have been read before movie writes that committed during the rebuild
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for movie_id, document in pending.items():
+                self._remove(self._index, movie_id)
+                if document is not None:
+                    self._add(self._index, movie_id, *document)
+
+    # The movie write endpoints call these after committing, before the first search there is nothing to update
+    def add(self, movie_id, title, description):
+        with self._lock:
+            if self._index is not None:
+                self._remove(self._index, movie_id)
+                self._add(self._index, movie_id, title, description)
+            self._track(movie_id, (title, description))
+
+    def remove(self, movie_id):
+        with self._lock:
+            if self._index is not None:
+                self._remove(self._index, movie_id)
+            self._track(movie_id, None)
+
+    def _track(self, movie_id, document):
+        if self._rebuilding:
+            self._pending[movie_id] = document
+        else:
+            self._pending.pop(movie_id, None)
+
+    def search(self, query, limit):
+        # Returns ([(movie_id, BM25 score)] best first, number of matching movies)
+        started = time.perf_counter()
+        terms = set(self.analyze(query))
+        index = self._current()
+        with self._lock:
+            documents = index['documents']
+            count = len(documents)
+            average_length = index['total_length'] / count if count else 0
+            scores = collections.defaultdict(float)
+            for term in terms:
+                postings = index['postings'].get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for movie_id, frequency in postings.items():
+                    length_norm = 1 - self.b + self.b * documents[movie_id][1] / average_length
+                    scores[movie_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            elapsed = time.perf_counter() - started
+            self._queries += 1
+            self._query_time_total += elapsed
+            self._last_query_ms = elapsed * 1000
+        return best, len(scores)
+
+    def stats(self):
+        # memory_bytes is the size of the index's dicts, tuples and term strings as reported by sys.getsizeof
+        with self._lock:
+            index = self._index or {'postings': {}, 'documents': {}}
+            memory = sys.getsizeof(index['postings']) + sys.getsizeof(index['documents'])
+            for term, postings in index['postings'].items():
+                memory += sys.getsizeof(term) + sys.getsizeof(postings)
+            for terms, _ in index['documents'].values():
+                memory += sys.getsizeof(terms)
+            return {
+                'documents': len(index['documents']),
+                'terms': len(index['postings']),
+                'postings': sum(len(postings) for postings in index['postings'].values()),
+                'memory_bytes': memory,
+                'queries': self._queries,
+                'last_query_ms': round(self._last_query_ms, 3),
+                'avg_query_ms': round(self._query_time_total / self._queries * 1000, 3) if self._queries else 0.0,
+                'builds': self._builds,
+                'stale': self._stale
+            }
+
+
+search_index = SearchIndex(**search_config)
+
+
+# Autocomplete configuration
+# suggestions are ranked by popularity (watch_history rows of the movie, or of the genre's movies); the top
+# max_results of every prefix up to precomputed_length characters are computed when the index is built, longer
+# prefixes are answered by a binary search over the sorted keys. A catalog change or an index older than max_age
+# seconds triggers a background rebuild while the previous index keeps answering
+autocomplete_config = {
+    'max_results': 10,
+    'precomputed_length': 3,
+    'max_age': 300
+}
+
+
+class Autocomplete(BackgroundIndex):
+    name = 'autocomplete'
+
+    def __init__(self, max_results, precomputed_length, max_age):
+        super().__init__(max_age)
+        self.max_results = max_results
+        self.precomputed_length = precomputed_length
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(re.findall(r'[a-z0-9]+', (text or '').lower()))
+
+    def _build(self):
+        connection = create_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT m.movie_id, m.title, COUNT(w.history_id)
+            FROM movie m
+            LEFT JOIN watch_history w ON m.movie_id = w.movie_id
+            GROUP BY m.movie_id, m.title
+        """)
+        entries = [(count, 'movie', movie_id, title) for movie_id, title, count in cursor.fetchall()]
+        cursor.execute("""
+            SELECT g.genre_id, g.genre_name, COUNT(w.history_id)
+            FROM genre g
+            LEFT JOIN movie_genre mg ON g.genre_id = mg.genre_id
+            LEFT JOIN watch_history w ON mg.movie_id = w.movie_id
+            GROUP BY g.genre_id, g.genre_name
+        """)
+        entries += [(count, 'genre', genre_id, genre_name) for genre_id, genre_name, count in cursor.fetchall()]
+        cursor.close()
+        connection.close()
+
+        # Every word of a label starts a key, so "dark" finds "The Dark Knight"
+        pairs = []
+        for entry, (_, _, _, label) in enumerate(entries):
+            words = self.normalize(label).split(' ')
+            pairs.extend((' '.join(words[start:]), entry) for start in range(len(words)) if words[start])
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        refs = [entry for _, entry in pairs]
+
+        candidates = collections.defaultdict(set)
+        for key, entry in pairs:
+            for length in range(1, min(len(key), self.precomputed_length) + 1):
+                candidates[key[:length]].add(entry)
+        top = {}
+        for prefix, prefix_entries in candidates.items():
+            for kind in (None, 'movie', 'genre'):
+                matching = [entry for entry in prefix_entries if kind is None or entries[entry][1] == kind]
+                top[prefix, kind] = self._rank(entries, matching, self.max_results)
+        return entries, keys, refs, top
+
+    @staticmethod
+    def _rank(entries, candidates, limit):
+        return heapq.nlargest(limit, candidates, key=lambda entry: (entries[entry][0], -entry))
+
+    def suggest(self, text, limit, kind=None):
+        entries, keys, refs, top = self._current()
+        prefix = self.normalize(text)
+        if not prefix:
+            return []
+        if len(prefix) <= self.precomputed_length and limit <= self.max_results:
+            best = top.get((prefix, kind), [])[:limit]
+        else:
+            # '~' sorts after every character a key can contain
+            start = bisect.bisect_left(keys, prefix)
+            end = bisect.bisect_left(keys, prefix + '~', start)
+            matching = {refs[i] for i in range(start, end) if kind is None or entries[refs[i]][1] == kind}
+            best = self._rank(entries, matching, limit)
+        return [{'type': entries[entry][1], 'id': entries[entry][2], 'label': entries[entry][3],
+                 'popularity': entries[entry][0]} for entry in best]
+
+    def stats(self):
+        index = self._index
+        return {
+            'entries': len(index[0]) if index else 0,
+            'keys': len(index[1]) if index else 0,
+            'precomputed_prefixes': len(index[3]) // 3 if index else 0,
+            'builds': self._builds,
+            'stale': self._stale
+        }
+
+
+autocomplete = Autocomplete(**autocomplete_config)
+
+
+# Movie filter configuration
+# /movies/filter is answered from columns of the whole catalog held in memory: a packed bitset of movie positions
+# per genre, the durations with their sort order and the average ratings. Catalog writes mark it stale and an index
+# older than max_age seconds is rebuilt as well; rating writes only update the ratings of the rated movies, and the
+# ratings column is reread from movie_rating_summary every ratings_max_age seconds to pick up other workers' writes
+filter_config = {
+    'max_age': 300,
+    'ratings_max_age': 10,
+    'default_min_duration': 0,
+    'default_max_duration': 1000,
+    'sorts': ('rating', 'duration', 'movie_id')
+}
+
+
+class MovieFilter(BackgroundIndex):
+    name = 'movie filter'
+
+    def __init__(self, max_age, ratings_max_age):
+        super().__init__(max_age)
+        self.ratings_max_age = ratings_max_age
+        self._ratings_at = None
+        self._ratings_refreshing = False
+        self._pending_ratings = set()  # movies rated while a rebuild was reading the tables, None: all of them
+        self._rating_updates = 0
+
+    def _build(self):
+        self._ratings_at = time.monotonic()
+        connection = create_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT m.movie_id, m.title, m.description, m.duration, COALESCE(s.avg_rating, 0)
+            FROM movie m
+            LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+            ORDER BY m.movie_id
+        """)
+        movies = cursor.fetchall()
+        cursor.execute("""
+            SELECT mg.movie_id, g.genre_name
+            FROM movie_genre mg
+            JOIN genre g ON mg.genre_id = g.genre_id
+        """)
+        memberships = cursor.fetchall()
+        cursor.close()
+        connection.close()
+
+        records = [{'movie_id': movie[0], 'title': movie[1], 'description': movie[2], 'duration': movie[3],
+                    'avg_rating': float(movie[4])} for movie in movies]
+        movie_ids = np.array([movie[0] for movie in movies], dtype=np.int64)
+        # Movies without a duration are NaN, which no duration range matches and which sorts last
+        durations = np.array([np.nan if movie[3] is None else movie[3] for movie in movies], dtype=np.float64)
+        ratings = np.array([record['avg_rating'] for record in records], dtype=np.float64)
+        duration_order = np.argsort(durations, kind='stable')
+
+        members = collections.defaultdict(list)
+        for movie_id, genre_name in memberships:
+            members[genre_name.lower()].append(movie_id)
+        genres = {}
+        for genre_name, genre_movie_ids in members.items():
+            positions = id_rows(np.array(genre_movie_ids, dtype=np.int64), movie_ids)
+            bits = np.zeros(len(movie_ids), dtype=bool)
+            bits[positions[positions >= 0]] = True
+            genres[genre_name] = np.packbits(bits)
+        return {'records': records, 'movie_ids': movie_ids, 'durations': durations, 'ratings': ratings,
+                'duration_order': duration_order, 'sorted_durations': durations[duration_order], 'genres': genres}
+
+    def _rebuild(self):
+        super()._rebuild()
+        # The new index may have been read before ratings that committed during the rebuild
+        with self._lock:
+            pending, self._pending_ratings = self._pending_ratings, set()
+        if pending != set():
+            self.update_ratings(None if pending is None else sorted(pending))
+
+    def update_ratings(self, movie_ids=None):
+        # Rereads the average rating of movie_ids (None: of every movie) from movie_rating_summary into the index
+        if movie_ids is not None and not movie_ids:
+            return
+        with self._lock:
+            index = self._index
+            if index is None:
+                return
+            if self._rebuilding:
+                if movie_ids is None or self._pending_ratings is None:
+                    self._pending_ratings = None
+                else:
+                    self._pending_ratings.update(movie_ids)
+        try:
+            connection = create_connection()
+            cursor = connection.cursor()
+            query = "SELECT movie_id, avg_rating FROM movie_rating_summary"
+            if movie_ids is not None:
+                query += f" WHERE movie_id IN ({', '.join(['%s'] * len(movie_ids))})"
+            cursor.execute(query, tuple(movie_ids or ()))
+            averages = dict(cursor.fetchall())
+            cursor.close()
+            connection.close()
+        except Exception as e:
+            print(f"Error updating {self.name} ratings: {e}")
+            self.mark_stale()
+            return
+
+        # Movies without a summary row have no ratings, which the filter treats as 0
+        if movie_ids is None:
+            ratings = np.zeros(len(index['movie_ids']), dtype=np.float64)
+            changed = index['movie_ids']
+        else:
+            ratings = index['ratings']
+            changed = np.array(movie_ids, dtype=np.int64)
+        positions = id_rows(changed, index['movie_ids'])
+        for movie_id, position in zip(changed.tolist(), positions.tolist()):
+            if position >= 0:
+                ratings[position] = float(averages.get(movie_id, 0))
+                index['records'][position]['avg_rating'] = ratings[position].item()
+        if movie_ids is None:
+            index['ratings'] = ratings
+            self._ratings_at = time.monotonic()
+        self._rating_updates += 1
+
+    def _refresh_ratings(self):
+        try:
+            with app.app_context():
+                self.update_ratings()
+        finally:
+            self._ratings_refreshing = False
+
+    def filter(self, genres, match_all, min_duration, max_duration, min_rating, max_rating, sort, after, limit):
+        # Returns (movies, total, next cursor value); the cursor is [sort value, movie_id] of the last movie
+        index = self._current()
+        if time.monotonic() - self._ratings_at > self.ratings_max_age and not self._ratings_refreshing:
+            self._ratings_refreshing = True
+            threading.Thread(target=self._refresh_ratings, daemon=True).start()
+        count = len(index['movie_ids'])
+        if genres:
+            sets = [index['genres'].get(genre_name.lower()) for genre_name in genres]
+            known = [bits for bits in sets if bits is not None]
+            if (match_all and len(known) < len(sets)) or not known:
+                bits = np.zeros((count + 7) // 8, dtype=np.uint8)
+            else:
+                bits = (np.bitwise_and if match_all else np.bitwise_or).reduce(known)
+        else:
+            bits = np.packbits(np.ones(count, dtype=bool))
+
+        start = np.searchsorted(index['sorted_durations'], min_duration, side='left')
+        end = np.searchsorted(index['sorted_durations'], max_duration, side='right')
+        in_range = np.zeros(count, dtype=bool)
+        in_range[index['duration_order'][start:end]] = True
+        in_range &= (index['ratings'] >= min_rating) & (index['ratings'] <= max_rating)
+        positions = np.flatnonzero(np.unpackbits(bits & np.packbits(in_range), count=count))
+        total = len(positions)
+
+        # Every order is ascending on key, ties broken by movie_id; ratings are sorted best first
+        movie_ids = index['movie_ids'][positions]
+        if sort == 'rating':
+            keys = -index['ratings'][positions]
+        elif sort == 'duration':
+            keys = index['durations'][positions]
+        else:
+            keys = movie_ids.astype(np.float64)
+        if after is not None:
+            last_key = -after[0] if sort == 'rating' else after[0]
+            keep = (keys > last_key) | ((keys == last_key) & (movie_ids > after[1]))
+            positions, movie_ids, keys = positions[keep], movie_ids[keep], keys[keep]
+        order = np.lexsort((movie_ids, keys))[:limit + 1]
+        page = [index['records'][position] for position in positions[order[:limit]]]
+        next_after = None
+        if len(order) > limit:
+            last = page[-1]
+            next_after = [last['avg_rating'] if sort == 'rating' else last[sort], last['movie_id']]
+        return page, total, next_after
+
+    def stats(self):
+        index = self._index
+        return {
+            'movies': len(index['movie_ids']) if index else 0,
+            'genres': len(index['genres']) if index else 0,
+            'bytes': sum(array.nbytes for array in list(index['genres'].values()) + [
+                index['movie_ids'], index['durations'], index['ratings'], index['duration_order'],
+                index['sorted_durations']]) if index else 0,
+            'age': self.age(),
+            'builds': self._builds,
+            'rating_updates': self._rating_updates,
+            'stale': self._stale
+        }
+
+
+movie_filter = MovieFilter(filter_config['max_age'], filter_config['ratings_max_age'])
+
+# Analytics snapshot configuration
+# with numpy installed, genre_statistics and top_movies_by_genre read a columnar copy of the catalog and rating
+# summaries instead of the live tables, ahead of analytics_cache and the shared cache, which then only serve the
+# fallback without numpy. It is written to directory as .npy files that every worker memory-maps. A catalog or rating
+# write marks it stale and it is rebuilt in the background, at most once every min_interval seconds; a snapshot
+# older than refresh_interval seconds is rebuilt too, and a newer one written by another worker (or the
+# build-analytics-snapshot command) is loaded as soon as it appears
+analytics_snapshot_config = {
+    'directory': 'analytics_snapshot',
+    'refresh_interval': 600,
+    'min_interval': 10
+}
+
+
+class GenreColumns:
+    # Movies are in movie_id order. The members of genre i are genre_members[genre_offsets[i]:genre_offsets[i + 1]]
+    # (movie positions, best rated first), so the top movies of a genre are a prefix of its slice; titles and
+    # descriptions are one utf-8 buffer, string 2 * i and 2 * i + 1 of movie i
+    arrays = ('movie_ids', 'rating_sums', 'rating_counts', 'genre_offsets', 'genre_members', 'text', 'text_offsets',
+              'text_nulls')
+
+    def __init__(self, movie_ids, rating_sums, rating_counts, genre_offsets, genre_members, text, text_offsets,
+                 text_nulls, info):
+        self.movie_ids = movie_ids
+        self.rating_sums = rating_sums
+        self.rating_counts = rating_counts
+        self.genre_offsets = genre_offsets
+        self.genre_members = genre_members
+        self.text = text
+        self.text_offsets = text_offsets
+        self.text_nulls = text_nulls
+        self.info = info
+        self._genre_positions = {genre_name.lower(): position for position, genre_name in enumerate(info['genres'])}
+
+    @classmethod
+    def build(cls, cursor):
+        cursor.execute("""
+            SELECT m.movie_id, m.title, m.description, COALESCE(s.rating_sum, 0), COALESCE(s.rating_count, 0)
+            FROM movie m
+            LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+            ORDER BY m.movie_id
+        """)
+        movies = cursor.fetchall()
+        cursor.execute("SELECT genre_id, genre_name FROM genre ORDER BY genre_name")
+        genres = cursor.fetchall()
+        cursor.execute("SELECT genre_id, movie_id FROM movie_genre")
+        memberships = cursor.fetchall()
+
+        movie_ids = np.array([movie[0] for movie in movies], dtype=np.int64)
+        rating_sums = np.array([float(movie[3]) for movie in movies], dtype=np.float64)
+        rating_counts = np.array([movie[4] for movie in movies], dtype=np.int64)
+        averages = np.divide(rating_sums, rating_counts, out=np.zeros_like(rating_sums), where=rating_counts > 0)
+
+        genre_positions = {genre_id: position for position, (genre_id, _) in enumerate(genres)}
+        member_genres = np.array([genre_positions.get(genre_id, -1) for genre_id, _ in memberships], dtype=np.int64)
+        member_movies = id_rows(np.array([movie_id for _, movie_id in memberships], dtype=np.int64), movie_ids)
+        known = (member_genres >= 0) & (member_movies >= 0)
+        member_genres, member_movies = member_genres[known], member_movies[known]
+        order = np.lexsort((movie_ids[member_movies], -averages[member_movies], member_genres))
+        genre_sizes = np.bincount(member_genres, minlength=len(genres))
+        genre_offsets = np.concatenate(([0], np.cumsum(genre_sizes))).astype(np.int64)
+
+        strings = [movie[field] for movie in movies for field in (1, 2)]
+        encoded = [(string or '').encode('utf-8') for string in strings]
+        text_offsets = np.concatenate(([0], np.cumsum([len(value) for value in encoded]))).astype(np.int64)
+        return cls(movie_ids, rating_sums, rating_counts, genre_offsets, member_movies[order],
+                   np.frombuffer(b''.join(encoded), dtype=np.uint8), text_offsets,
+                   np.array([string is None for string in strings], dtype=bool),
+                   {'built_at': time.time(), 'genres': [genre_name for _, genre_name in genres],
+                    'movies': len(movies), 'memberships': int(len(member_movies))})
+
+    def save(self, directory):
+        write_array_files(directory, {name: getattr(self, name) for name in self.arrays}, self.info)
+
+    @classmethod
+    def load(cls, manifest_path):
+        arrays, info = read_array_files(manifest_path)
+        return cls(*(arrays[name] for name in cls.arrays), info)
+
+    def age(self):
+        return round(time.time() - self.info['built_at'], 1)
+
+    def string(self, index):
+        if self.text_nulls[index]:
+            return None
+        return bytes(self.text[self.text_offsets[index]:self.text_offsets[index + 1]]).decode('utf-8')
+
+    def genre_statistics(self):
+        movie_counts = np.diff(self.genre_offsets)
+        member_genres = np.repeat(np.arange(len(movie_counts)), movie_counts)
+        rating_sums = np.bincount(member_genres, weights=self.rating_sums[self.genre_members],
+                                  minlength=len(movie_counts))
+        rating_counts = np.bincount(member_genres, weights=self.rating_counts[self.genre_members],
+                                    minlength=len(movie_counts))
+        averages = np.divide(rating_sums, rating_counts, out=np.zeros(len(movie_counts)), where=rating_counts > 0)
+        return [{'genre_name': self.info['genres'][genre], 'movie_count': int(movie_counts[genre]),
+                 'avg_rating': round(float(averages[genre]), 2) if rating_counts[genre] else None}
+                for genre in np.argsort(-movie_counts, kind='stable')]
+
+    def top_movies(self, genre_name, limit):
+        genre = self._genre_positions.get(str(genre_name).strip().lower())
+        if genre is None:
+            return []
+        start = self.genre_offsets[genre]
+        members = self.genre_members[start:min(start + max(limit, 0), self.genre_offsets[genre + 1])]
+        return [{'movie_id': int(self.movie_ids[movie]), 'title': self.string(2 * movie),
+                 'description': self.string(2 * movie + 1),
+                 'rating': round(float(self.rating_sums[movie] / self.rating_counts[movie]), 5)
+                 if self.rating_counts[movie] else 0.0} for movie in members]
+
+
+class AnalyticsSnapshot(BackgroundIndex):
+    name = 'analytics snapshot'
+
+    def __init__(self, directory, refresh_interval, min_interval):
+        super().__init__(refresh_interval)
+        self.directory = directory
+        self.min_interval = min_interval
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._changed_at = 0.0  # wall clock time of the last write in this process, comparable with built_at
+
+    def mark_stale(self):
+        self._changed_at = time.time()
+
+    def _expired(self):
+        columns = self._index
+        if columns.age() > self.max_age:
+            return True
+        if columns.info['built_at'] < self._changed_at and columns.age() >= self.min_interval:
+            return True
+        # Another worker may have written a newer snapshot; the manifest is replaced, so its mtime moves
+        try:
+            return os.stat(self.manifest_path).st_mtime > columns.manifest_mtime
+        except OSError:
+            return False
+
+    def _load(self):
+        # The mtime is taken first, so a manifest replaced during the load is seen as newer afterwards
+        manifest_mtime = os.stat(self.manifest_path).st_mtime
+        columns = GenreColumns.load(self.manifest_path)
+        columns.manifest_mtime = manifest_mtime
+        return columns
+
+    def _load_fresh(self):
+        try:
+            columns = self._load()
+        except (OSError, ValueError, KeyError):
+            return None
+        return None if columns.age() > self.max_age or columns.info['built_at'] < self._changed_at else columns
+
+    def _build(self):
+        # Workers expire together, so only the one holding the lock file queries MySQL; the others wait for it here,
+        # in their background refresh while the previous mapping keeps answering, and then load what it wrote
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'build.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+            columns = self._load_fresh()
+            if columns is not None:
+                return columns
+            connection = create_connection()
+            cursor = connection.cursor()
+            columns = GenreColumns.build(cursor)
+            cursor.close()
+            connection.close()
+            columns.save(self.directory)
+            return self._load()
+
+    def get(self):
+        return self._current()
+
+    def stats(self):
+        columns = self._index
+        return {
+            'movies': columns.info['movies'] if columns else 0,
+            'genres': len(columns.info['genres']) if columns else 0,
+            'bytes': sum(getattr(columns, name).nbytes for name in GenreColumns.arrays) if columns else 0,
+            'snapshot_age': columns.age() if columns else None,
+            'builds': self._builds
+        }
+
+
+analytics_snapshot = AnalyticsSnapshot(**analytics_snapshot_config)
+
+
 @app.route('/')
 def home():
     """
@@ -84,26 +2235,53 @@ def home():
     return "Welcome to the Film Recommendation Project API!"
 
 
-@app.route('/initialize-database', methods=['GET'])
-def initialize_database():
+@app.route('/pool/stats', methods=['GET'])
+@token_required
+def get_pool_stats(current_user):
     """
-    Initialize the database and create tables
+    Get Connection Pool Statistics (Admin Only)
     ---
     tags:
-      - Database
+      - Monitoring
+    security:
+      - BearerAuth: []
     responses:
       200:
-        description: Database initialized successfully
+        description: Current state of the database connection pool
         content:
           application/json:
             schema:
               type: object
               properties:
-                message:
-                  type: string
-                  example: Database and tables initialized successfully with relationships!
+                pool:
+                  type: object
+                  properties:
+                    pool_size:
+                      type: integer
+                    max_overflow:
+                      type: integer
+                    opened:
+                      type: integer
+                    in_use:
+                      type: integer
+                    idle:
+                      type: integer
+                    waiting:
+                      type: integer
+                    checkouts:
+                      type: integer
+                    timeouts:
+                      type: integer
+                    reconnects:
+                      type: integer
+                    avg_checkout_ms:
+                      type: number
+                      format: float
+                    max_checkout_ms:
+                      type: number
+                      format: float
       403:
-        description: Database already initialized
+        description: Access denied
         content:
           application/json:
             schema:
@@ -111,25 +2289,255 @@ def initialize_database():
               properties:
                 message:
                   type: string
-                  example: Database has already been initialized!
-      500:
-        description: Internal server error
+                  example: Access denied
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+    return jsonify({'pool': connection_pool.stats()}), 200
+
+
+@app.route('/cache/stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """
+    Get Catalog Cache Statistics (Admin Only)
+    ---
+    tags:
+      - Monitoring
+    security:
+      - BearerAuth: []
+    responses:
+      200:
+        description: Size and hit/miss/eviction counters of each in-process catalog cache
         content:
           application/json:
             schema:
               type: object
               properties:
-                error:
-                  type: string
-                  example: Error connecting to MySQL
-    """
-    global db_initialized
-    if db_initialized:
-        return jsonify({"message": "Database has already been initialized!"}), 403
-    try:
-        conn = create_connection()
-        cursor = conn.cursor()
-
+                caches:
+                  type: object
+                  additionalProperties:
+                    type: object
+                    properties:
+                      size:
+                        type: integer
+                      max_entries:
+                        type: integer
+                      ttl:
+                        type: integer
+                      hits:
+                        type: integer
+                      misses:
+                        type: integer
+                      hit_ratio:
+                        type: number
+                        format: float
+                      evictions:
+                        type: integer
+                      expirations:
+                        type: integer
+                shared:
+                  type: object
+                  properties:
+                    enabled:
+                      type: boolean
+                    ttl:
+                      type: integer
+                    errors:
+                      type: integer
+                analytics:
+                  type: object
+                  description: Coalesced analytics results, with the LRU counters plus stale_hits, coalesced and refreshes
+                content:
+                  type: object
+                  description: Content recommender vectors (movies, features, matrix_bytes, builds, stale)
+                search:
+                  type: object
+                  description: Movie search index (documents, terms, postings, memory_bytes, queries, avg_query_ms, builds, stale)
+                autocomplete:
+                  type: object
+                  description: Autocomplete index (entries, keys, precomputed_prefixes, builds, stale)
+                filter:
+                  type: object
+                  description: Movie filter columns (movies, genres, bytes, age, builds, rating_updates, stale)
+                analytics_snapshot:
+                  type: object
+                  description: Columnar analytics snapshot (movies, genres, bytes, snapshot_age, builds)
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+    return jsonify({'caches': {
+        'movie': movie_cache.stats(),
+        'genre': genre_cache.stats(),
+        'genre_list': genre_list_cache.stats(),
+        'movie_genres': movie_genres_cache.stats()
+    }, 'shared': shared_cache.stats(), 'analytics': analytics_cache.stats(), 'content': content_index.stats(),
+        'search': search_index.stats(), 'autocomplete': autocomplete.stats(), 'filter': movie_filter.stats(),
+        'analytics_snapshot': analytics_snapshot.stats()}), 200
+
+
+@app.route('/watch-history/buffer/stats', methods=['GET'])
+@token_required
+def get_watch_history_buffer_stats(current_user):
+    """
+    Get Watch History Buffer Statistics (Admin Only)
+    ---
+    tags:
+      - Monitoring
+    security:
+      - BearerAuth: []
+    responses:
+      200:
+        description: Queue depth and flush metrics of the buffered watch history ingestion
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                mode:
+                  type: string
+                durability:
+                  type: string
+                buffer:
+                  type: object
+                  properties:
+                    queue_depth:
+                      type: integer
+                    max_queue_depth:
+                      type: integer
+                    enqueued:
+                      type: integer
+                    flushes:
+                      type: integer
+                    flushed_rows:
+                      type: integer
+                    failed_rows:
+                      type: integer
+                    last_flush_ms:
+                      type: number
+                      format: float
+                    avg_flush_ms:
+                      type: number
+                      format: float
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+    return jsonify({
+        'mode': watch_history_config['mode'],
+        'durability': watch_history_config['durability'],
+        'buffer': watch_history_buffer.stats()
+    }), 200
+
+
+# Secondary indexes for the lookups the endpoints issue, as (table, index name, columns[, index type])
+# InnoDB appends the primary key to every secondary index, so (movie_id) on rating already orders by rating_id
+schema_indexes = [
+    ('watch_history', 'idx_watch_history_user_movie', 'user_id, movie_id'),   # add_recommendation watched check, watch history of a user
+    ('recommendation', 'idx_recommendation_user_movie', 'user_id, movie_id'), # delete_recommendation, recommendations of a user
+    ('rating', 'idx_rating_movie_score', 'movie_id, rating_id, score'),       # ratings of a movie by cursor, AVG(score) per movie
+    ('review', 'idx_review_movie_review', 'movie_id, review_id'),             # reviews of a movie by cursor
+    ('movie_genre', 'idx_movie_genre_genre_movie', 'genre_id, movie_id'),     # movies of a genre, genre filters
+    ('movie', 'idx_movie_duration', 'duration'),                              # filter_movies duration range
+    ('movie_rating_summary', 'idx_summary_avg_rating', 'avg_rating'),         # top-rated movie lookup
+    ('review', 'ftx_review_text', 'review_text', 'FULLTEXT')                  # search_reviews
+]
+
+# Indexes earlier versions created that no query uses any more, as (table, index name); they only cost writes
+retired_indexes = [
+    ('movie', 'ftx_movie_text')                                               # FULLTEXT on title, description
+]
+
+
+def ensure_indexes(cursor):
+    # MySQL has no CREATE INDEX IF NOT EXISTS, so the existing indexes are read first; this is also the migration
+    # path for databases created before an index was added to schema_indexes or retired. Returns (created, dropped)
+    cursor.execute("""
+        SELECT DISTINCT table_name, index_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+    """)
+    existing = {(table.lower(), index_name.lower()) for table, index_name in cursor.fetchall()}
+
+    created = []
+    for table, index_name, columns, *index_type in schema_indexes:
+        if (table, index_name) not in existing:
+            cursor.execute(f"CREATE {' '.join(index_type + ['INDEX'])} {index_name} ON {table} ({columns})")
+            created.append(index_name)
+
+    dropped = []
+    for table, index_name in retired_indexes:
+        if (table, index_name) in existing:
+            cursor.execute(f"DROP INDEX {index_name} ON {table}")
+            dropped.append(index_name)
+    return created, dropped
+
+
+@app.route('/initialize-database', methods=['GET'])
+def initialize_database():
+    """
+    Initialize the database and create tables
+    ---
+    tags:
+      - Database
+    responses:
+      200:
+        description: Database initialized successfully
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Database and tables initialized successfully with relationships!
+      403:
+        description: Database already initialized
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Database has already been initialized!
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Error connecting to MySQL
+    """
+    global db_initialized
+    if db_initialized:
+        return jsonify({"message": "Database has already been initialized!"}), 403
+    try:
+        conn = create_connection()
+        cursor = conn.cursor()
+
         # 1. user Table
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS user (
@@ -244,6 +2652,60 @@ def initialize_database():
         )ENGINE=INNODB;
         """)
 
+        # 9. movie_rating_summary Table
+        # Per-movie rating count and sum maintained by the rating endpoints in the same transaction as the rating itself
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movie_rating_summary (
+            movie_id INT PRIMARY KEY,
+            rating_count INT NOT NULL DEFAULT 0,
+            rating_sum DECIMAL(12, 1) NOT NULL DEFAULT 0,
+            avg_rating DECIMAL(7, 5) AS (IF(rating_count > 0, rating_sum / rating_count, 0)) STORED,
+            FOREIGN KEY (movie_id) REFERENCES movie(movie_id)
+            ON DELETE CASCADE
+            ON UPDATE CASCADE
+        )ENGINE=INNODB;
+        """)
+        # Backfill movies rated before the summary existed, movies already summarized are left untouched
+        cursor.execute("""
+        INSERT IGNORE INTO movie_rating_summary (movie_id, rating_count, rating_sum)
+        SELECT movie_id, COUNT(*), SUM(score) FROM rating GROUP BY movie_id;
+        """)
+
+        # 10. movie_similarity Table
+        # Top neighbors of every movie in rank order, written by the rebuild-similarity command
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movie_similarity (
+            movie_id INT NOT NULL,
+            neighbor_rank SMALLINT NOT NULL,
+            similar_movie_id INT NOT NULL,
+            similarity FLOAT NOT NULL,
+            rating_similarity FLOAT NOT NULL,
+            co_watch_count INT NOT NULL,
+            PRIMARY KEY (movie_id, neighbor_rank),
+            FOREIGN KEY (movie_id) REFERENCES movie(movie_id)
+            ON DELETE CASCADE
+            ON UPDATE CASCADE,
+            FOREIGN KEY (similar_movie_id) REFERENCES movie(movie_id)
+            ON DELETE CASCADE
+            ON UPDATE CASCADE
+        )ENGINE=INNODB;
+        """)
+
+        # 11. similarity_dirty_movie Table
+        # Movies whose ratings changed since their neighbors were last computed, marked by the rating endpoints
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS similarity_dirty_movie (
+            movie_id INT PRIMARY KEY,
+            marked_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            FOREIGN KEY (movie_id) REFERENCES movie(movie_id)
+            ON DELETE CASCADE
+            ON UPDATE CASCADE
+        )ENGINE=INNODB;
+        """)
+
+        # 12. Secondary indexes
+        ensure_indexes(cursor)
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -251,6 +2713,571 @@ def initialize_database():
         return jsonify({"message": "Database and tables initialized successfully with relationships!"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@app.cli.command('migrate-indexes')
+def migrate_indexes():
+    """Create the secondary indexes missing from an existing database and drop the retired ones."""
+    connection = create_connection()
+    cursor = connection.cursor()
+    created, dropped = ensure_indexes(cursor)
+    cursor.close()
+    connection.close()
+    click.echo(f"Created indexes: {', '.join(created)}" if created else "All indexes already exist")
+    if dropped:
+        click.echo(f"Dropped retired indexes: {', '.join(dropped)}")
+
+
+# SQL the endpoints issue that the explain-queries command checks, shared with it so that what is checked is what
+# runs; every entry appears in explain_queries, statements the command does not check stay inline. Entries with
+# {fields} are templates the caller formats
+queries = {
+    # Sensitive fields like password are not selected
+    'get_all_users': """
+        SELECT user_id, user_name, email, preferences FROM user
+        WHERE user_id > %s
+        ORDER BY user_id
+        LIMIT %s
+    """,
+    'get_user_by_id': "SELECT user_id, user_name, email, preferences FROM user WHERE user_id = %s",
+    'login': "SELECT * FROM user WHERE email = %s",
+    'get_all_movies': "SELECT * FROM movie WHERE movie_id > %s ORDER BY movie_id LIMIT %s",
+    'get_movie': "SELECT * FROM movie WHERE movie_id = %s",
+    'get_all_genres': "SELECT * FROM genre WHERE genre_id > %s ORDER BY genre_id LIMIT %s",
+    'get_genre': "SELECT * FROM genre WHERE genre_id = %s",
+    'get_genres_of_movie': """
+        SELECT g.genre_id, g.genre_name
+        FROM genre g
+        JOIN movie_genre mg ON g.genre_id = mg.genre_id
+        WHERE mg.movie_id = %s
+    """,
+    'get_movies_of_genre': """
+        SELECT m.movie_id, m.title, m.description, m.duration
+        FROM movie m
+        JOIN movie_genre mg ON m.movie_id = mg.movie_id
+        WHERE mg.genre_id = %s
+    """,
+    'remove_genre_from_movie': "DELETE FROM movie_genre WHERE movie_id = %s AND genre_id = %s",
+    # Pages append LIMIT, the streamed mode reads to the end
+    'get_ratings_for_movie': """
+        SELECT r.rating_id, r.user_id, r.score, u.user_name
+        FROM rating r
+        JOIN user u ON r.user_id = u.user_id
+        WHERE r.movie_id = %s AND r.rating_id > %s
+        ORDER BY r.rating_id
+    """,
+    'lock_rating': "SELECT user_id, movie_id, score FROM rating WHERE rating_id = %s FOR UPDATE",
+    'get_reviews_for_movie': """
+        SELECT r.review_id, r.user_id, r.review_text, u.user_name
+        FROM review r
+        JOIN user u ON r.user_id = u.user_id
+        WHERE r.movie_id = %s AND r.review_id > %s
+        ORDER BY r.review_id
+    """,
+    'review_owner': "SELECT user_id FROM review WHERE review_id = %s",
+    'get_watch_history_for_user': """
+        SELECT h.history_id, h.movie_id, m.title
+        FROM watch_history h
+        JOIN movie m ON h.movie_id = m.movie_id
+        WHERE h.user_id = %s
+    """,
+    'watched_movie': "SELECT history_id FROM watch_history WHERE user_id = %s AND movie_id = %s",
+    'get_recommendations_for_user': """
+        SELECT r.recommendation_id, r.movie_id, m.title
+        FROM recommendation r
+        JOIN movie m ON r.movie_id = m.movie_id
+        WHERE r.user_id = %s
+    """,
+    'delete_recommendation': "DELETE FROM recommendation WHERE user_id = %s AND movie_id = %s",
+    # The MySQL fallback of /movies/filter: the range conditions, optionally followed by the genre condition,
+    # make up {conditions}
+    'filter_movies_ranges': "m.duration BETWEEN %s AND %s AND COALESCE(s.avg_rating, 0) BETWEEN %s AND %s",
+    'filter_movies_genres': """ AND m.movie_id IN (
+        SELECT mg.movie_id
+        FROM movie_genre mg
+        JOIN genre g ON mg.genre_id = g.genre_id
+        WHERE g.genre_name IN ({placeholders})
+        GROUP BY mg.movie_id
+        HAVING COUNT(DISTINCT g.genre_id) >= %s
+    )""",
+    'filter_movies_count': """
+        SELECT COUNT(*)
+        FROM movie m
+        LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+        WHERE {conditions}
+    """,
+    'filter_movies': """
+        SELECT m.movie_id, m.title, m.description, m.duration,
+               COALESCE(s.avg_rating, 0) AS avg_rating
+        FROM movie m
+        LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+        WHERE {conditions}
+        ORDER BY {sort_column} {direction}, m.movie_id
+        LIMIT %s
+    """,
+    'top_movies_by_genre': """
+        SELECT m.movie_id, m.title, m.description, COALESCE(s.avg_rating, 0) AS avg_rating
+        FROM movie m
+        JOIN movie_genre mg ON m.movie_id = mg.movie_id
+        JOIN genre g ON mg.genre_id = g.genre_id
+        LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+        WHERE g.genre_name = %s
+        ORDER BY avg_rating DESC
+        LIMIT %s
+    """,
+    'genre_statistics': """
+        SELECT g.genre_name, COUNT(m.movie_id) AS movie_count,
+               SUM(s.rating_sum) / NULLIF(SUM(s.rating_count), 0) AS avg_rating
+        FROM genre g
+        LEFT JOIN movie_genre mg ON g.genre_id = mg.genre_id
+        LEFT JOIN movie m ON mg.movie_id = m.movie_id
+        LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+        GROUP BY g.genre_name
+        ORDER BY movie_count DESC
+    """,
+    'get_movie_detail': """
+        SELECT m.movie_id, m.title, m.description, m.duration,
+               COALESCE(s.rating_count, 0), s.avg_rating
+        FROM movie m
+        LEFT JOIN movie_rating_summary s ON m.movie_id = s.movie_id
+        WHERE m.movie_id = %s
+    """,
+    'rating_histogram': """
+        SELECT FLOOR(score) AS star, COUNT(*) FROM rating
+        WHERE movie_id = %s
+        GROUP BY star
+    """,
+    'first_reviews': """
+        SELECT r.review_id, r.user_id, r.review_text, u.user_name
+        FROM review r
+        JOIN user u ON r.user_id = u.user_id
+        WHERE r.movie_id = %s
+        ORDER BY r.review_id
+        LIMIT %s
+    """,
+    # Relevance is rounded so that the value handed out in the cursor compares equal when it comes back
+    'search_reviews_relevance': "ROUND(MATCH(r.review_text) AGAINST (%s IN NATURAL LANGUAGE MODE), 6)",
+    'search_reviews': """
+        SELECT r.review_id, r.movie_id, r.user_id, u.user_name, r.review_text, {relevance} AS relevance
+        FROM review r
+        JOIN user u ON r.user_id = u.user_id
+        WHERE MATCH(r.review_text) AGAINST (%s IN NATURAL LANGUAGE MODE)
+    """,
+    'search_reviews_order': " ORDER BY relevance DESC, r.review_id LIMIT %s",
+    'get_similar_movies': """
+        SELECT s.similar_movie_id, m.title, s.similarity, s.rating_similarity, s.co_watch_count
+        FROM movie_similarity s
+        JOIN movie m ON s.similar_movie_id = m.movie_id
+        WHERE s.movie_id = %s
+        ORDER BY s.neighbor_rank
+        LIMIT %s
+    """,
+    'similarity_dependents': "SELECT DISTINCT movie_id FROM movie_similarity WHERE similar_movie_id IN ({placeholders})",
+    'top_average_rating': "SELECT MAX(avg_rating) FROM movie_rating_summary",
+    'top_rated_genres': """
+        SELECT DISTINCT g.genre_id, g.genre_name
+        FROM movie_rating_summary s
+        JOIN movie_genre mg ON s.movie_id = mg.movie_id
+        JOIN genre g ON mg.genre_id = g.genre_id
+        WHERE s.avg_rating = %s
+    """,
+    'genres_with_movies': """
+        SELECT DISTINCT g.genre_id, g.genre_name
+        FROM genre g
+        JOIN movie_genre mg ON g.genre_id = mg.genre_id
+    """
+}
+
+# (name, query, sample parameters) checked by the explain-queries command
+explain_queries = [
+    ('get_all_users', queries['get_all_users'], (0, 51)),
+    ('get_user_by_id', queries['get_user_by_id'], (1,)),
+    ('login', queries['login'], ('admin@example.com',)),
+    ('get_all_movies', queries['get_all_movies'], (0, 51)),
+    ('get_movie', queries['get_movie'], (1,)),
+    ('get_all_genres', queries['get_all_genres'], (0, 51)),
+    ('get_genre', queries['get_genre'], (1,)),
+    ('get_genres_of_movie', queries['get_genres_of_movie'], (1,)),
+    ('get_movies_of_genre', queries['get_movies_of_genre'], (1,)),
+    ('remove_genre_from_movie', queries['remove_genre_from_movie'], (1, 1)),
+    ('get_ratings_for_movie', queries['get_ratings_for_movie'] + " LIMIT %s", (1, 0, 51)),
+    ('update_rating', queries['lock_rating'], (1,)),
+    ('get_reviews_for_movie', queries['get_reviews_for_movie'] + " LIMIT %s", (1, 0, 51)),
+    ('update_review', queries['review_owner'], (1,)),
+    ('get_watch_history_for_user', queries['get_watch_history_for_user'], (1,)),
+    ('add_recommendation', queries['watched_movie'], (1, 1)),
+    ('get_recommendations_for_user', queries['get_recommendations_for_user'], (1,)),
+    ('delete_recommendation', queries['delete_recommendation'], (1, 1)),
+    ('filter_movies', queries['filter_movies_count'].format(
+        conditions=queries['filter_movies_ranges'] + queries['filter_movies_genres'].format(placeholders='%s')),
+     (0, 1000, 0, 5, 'Action', 1)),
+    ('filter_movies', queries['filter_movies'].format(
+        conditions=queries['filter_movies_ranges'] + queries['filter_movies_genres'].format(placeholders='%s'),
+        sort_column='COALESCE(s.avg_rating, 0)', direction='DESC'), (0, 1000, 0, 5, 'Action', 1, 51)),
+    ('top_movies_by_genre', queries['top_movies_by_genre'], ('Action', 10)),
+    ('genre_statistics', queries['genre_statistics'], ()),
+    ('get_movie_detail', queries['get_movie_detail'], (1,)),
+    ('get_movie_detail', queries['rating_histogram'], (1,)),
+    ('get_movie_detail', queries['first_reviews'], (1, 11)),
+    ('search_reviews', queries['search_reviews'].format(relevance=queries['search_reviews_relevance'])
+     + queries['search_reviews_order'], ('great', 'great', 51)),
+    ('get_similar_movies', queries['get_similar_movies'], (1, 20)),
+    ('rebuild_similarity', queries['similarity_dependents'].format(placeholders='%s'), (1,)),
+    ('get_genres_of_top_rated_movie', queries['top_average_rating'], ()),
+    ('get_genres_of_top_rated_movie', queries['top_rated_genres'], (5,)),
+    ('get_genres_of_top_rated_movie', queries['genres_with_movies'], ())
+]
+
+# Full scans that are expected, by (name, table): genre_statistics and the unrated case of the top-rated genres
+# list every genre, and the MySQL fallback of /movies/filter ranges over the whole catalog (the in-memory filter
+# serves it whenever numpy is installed)
+expected_full_scans = {
+    ('genre_statistics', 'g'),
+    ('get_genres_of_top_rated_movie', 'g'),
+    ('filter_movies', 'm')
+}
+
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    """EXPLAIN every query the app issues and flag full table scans that are not expected."""
+    connection = create_connection()
+    cursor = connection.cursor(dictionary=True)
+    flagged = 0
+    for name, query, params in explain_queries:
+        try:
+            cursor.execute("EXPLAIN " + query, params)
+        except mysql.connector.Error as e:
+            click.echo(f"{'ERROR':9}  {name:30} {e}")
+            continue
+        for row in cursor.fetchall():
+            if row['type'] != 'ALL':
+                status = 'ok'
+            elif (name, row['table']) in expected_full_scans:
+                status = 'expected'
+            else:
+                status = 'FULL SCAN'
+                flagged += 1
+            click.echo(f"{status:9}  {name:30} table={row['table']} type={row['type']} "
+                       f"key={row['key']} rows={row['rows']}")
+    cursor.close()
+    connection.close()
+    click.echo(f"{flagged} unexpected full table scan(s) found")
+    if flagged:
+        raise SystemExit(1)
+
+
+@app.cli.command('rebuild-rating-summary')
+def rebuild_rating_summary():
+    """Recompute movie_rating_summary from the rating table."""
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM movie_rating_summary")
+    cursor.execute("""
+        INSERT INTO movie_rating_summary (movie_id, rating_count, rating_sum)
+        SELECT movie_id, COUNT(*), SUM(score) FROM rating GROUP BY movie_id
+    """)
+    rebuilt = cursor.rowcount
+    connection.commit()
+    cursor.close()
+    connection.close()
+    click.echo(f"Rebuilt rating summary for {rebuilt} movie(s)")
+
+
+@app.cli.command('verify-rating-summary')
+def verify_rating_summary():
+    """Compare movie_rating_summary with the rating table and report drift."""
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT a.movie_id, a.rating_count, a.rating_sum, s.rating_count, s.rating_sum
+        FROM (
+            SELECT movie_id, COUNT(*) AS rating_count, SUM(score) AS rating_sum
+            FROM rating
+            GROUP BY movie_id
+        ) AS a
+        LEFT JOIN movie_rating_summary s ON a.movie_id = s.movie_id
+        WHERE s.movie_id IS NULL OR a.rating_count <> s.rating_count OR a.rating_sum <> s.rating_sum
+        UNION ALL
+        SELECT s.movie_id, 0, 0, s.rating_count, s.rating_sum
+        FROM movie_rating_summary s
+        WHERE s.rating_count <> 0 AND NOT EXISTS (SELECT 1 FROM rating r WHERE r.movie_id = s.movie_id)
+    """)
+    drift = cursor.fetchall()
+    cursor.close()
+    connection.close()
+
+    for movie_id, actual_count, actual_sum, summary_count, summary_sum in drift:
+        click.echo(f"movie {movie_id}: rating table has count={actual_count} sum={actual_sum}, "
+                   f"summary has count={summary_count} sum={summary_sum}")
+    click.echo(f"{len(drift)} movie(s) drifted")
+    if drift:
+        raise SystemExit(1)
+
+
+@app.cli.command('benchmark-review-search')
+@click.argument('search')
+@click.option('--runs', type=int, default=5, help='Times each query is repeated.')
+def benchmark_review_search(search, runs):
+    """Time the FULLTEXT review search against a LIKE scan for the same words."""
+    connection = create_connection()
+    cursor = connection.cursor()
+    like_conditions = ' AND '.join(['review_text LIKE %s'] * len(search.split()))
+    variants = [
+        ('MATCH', "SELECT COUNT(*) FROM review WHERE MATCH(review_text) AGAINST (%s IN NATURAL LANGUAGE MODE)",
+         (search,)),
+        ('LIKE', f"SELECT COUNT(*) FROM review WHERE {like_conditions}",
+         tuple(f"%{word}%" for word in search.split()))
+    ]
+    for name, query, params in variants:
+        cursor.execute("EXPLAIN " + query, params)
+        plan = cursor.fetchall()
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            matches = cursor.fetchone()[0]
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        click.echo(f"{name:5}  matches={matches}  median={timings[len(timings) // 2]:.2f} ms  "
+                   f"min={timings[0]:.2f} ms  access={plan[0][4] if plan else '?'}")
+    cursor.close()
+    connection.close()
+
+
+@app.cli.command('train-recommender')
+@click.option('--evaluate/--no-evaluate', default=True, help='Report recall@K from a model trained without held-out ratings.')
+def train_recommender(evaluate):
+    """Train the collaborative-filtering model from the rating table and save it."""
+    if np is None:
+        click.echo("train-recommender needs numpy and scipy")
+        raise SystemExit(1)
+    connection = create_connection()
+    cursor = connection.cursor()
+    user_ids, movie_ids, scores = load_rating_arrays(cursor)
+    cursor.close()
+    connection.close()
+    if not len(scores):
+        click.echo("No ratings to train on")
+        raise SystemExit(1)
+
+    config = recommender_config
+    info = {'ratings': len(scores), 'factors': config['factors'], 'iterations': config['iterations'], 'top_k': config['top_k']}
+    if evaluate:
+        started = time.monotonic()
+        recall, info['evaluated_users'] = recall_at_k(user_ids, movie_ids, scores, config)
+        info['recall_at_k'] = round(recall, 4) if recall is not None else None
+        click.echo(f"recall@{config['top_k']}: {info['recall_at_k']} over {info['evaluated_users']} user(s) "
+                   f"({time.monotonic() - started:.2f}s)")
+
+    started = time.monotonic()
+    model = RatingFactorization.train(user_ids, movie_ids, scores, config['factors'], config['iterations'],
+                                      config['regularization'], config['seed'], config['solve_chunk'])
+    info['training_seconds'] = round(time.monotonic() - started, 3)
+    info['trained_at'] = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    info['users'] = len(model.user_ids)
+    info['movies'] = len(model.movie_ids)
+    model.info = info
+    model.save(config['model_path'])
+    click.echo(f"Trained on {info['ratings']} rating(s) from {info['users']} user(s) and {info['movies']} movie(s) "
+               f"in {info['training_seconds']}s, saved to {config['model_path']}")
+
+@app.cli.command('rebuild-similarity')
+@click.option('--full', is_flag=True, help='Recompute every movie instead of the ones marked dirty by writes.')
+def rebuild_similarity(full):
+    """Recompute the movie_similarity neighbor lists."""
+    if np is None:
+        click.echo("rebuild-similarity needs numpy and scipy")
+        raise SystemExit(1)
+    started = time.monotonic()
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute("SELECT movie_id, marked_at FROM similarity_dirty_movie")
+    dirty = cursor.fetchall()
+    if not full and not dirty:
+        cursor.close()
+        connection.close()
+        click.echo("No movies marked dirty")
+        return
+
+    vectors = SimilarityVectors.load(cursor)
+    if full:
+        targets = [int(movie_id) for movie_id in vectors.movie_ids]
+        rows = vectors.neighbors(targets)
+        cursor.execute("DELETE FROM movie_similarity")
+    else:
+        # A dirty movie's similarity to every other movie changed, so besides its own list the lists that contain it
+        # and the lists of its new neighbors are recomputed. Other movies that would now rank it among their
+        # neighbors pick it up at the next --full rebuild
+        dirty_ids = sorted({movie_id for movie_id, _ in dirty})
+        rows = vectors.neighbors(dirty_ids)
+        affected = {row[2] for row in rows}
+        for start in range(0, len(dirty_ids), bulk_config['chunk_size']):
+            chunk = dirty_ids[start:start + bulk_config['chunk_size']]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(queries['similarity_dependents'].format(placeholders=placeholders), chunk)
+            affected.update(row[0] for row in cursor.fetchall())
+        affected = sorted(affected - set(dirty_ids))
+        rows += vectors.neighbors(affected)
+        targets = dirty_ids + affected
+        for start in range(0, len(targets), bulk_config['chunk_size']):
+            chunk = targets[start:start + bulk_config['chunk_size']]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM movie_similarity WHERE movie_id IN ({placeholders})", chunk)
+
+    chunked_executemany(cursor, """
+        INSERT INTO movie_similarity
+            (movie_id, neighbor_rank, similar_movie_id, similarity, rating_similarity, co_watch_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows)
+    # Movies marked again while this rebuild ran keep their newer mark
+    for start in range(0, len(dirty), bulk_config['chunk_size']):
+        chunk = dirty[start:start + bulk_config['chunk_size']]
+        placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+        cursor.execute(f"DELETE FROM similarity_dirty_movie WHERE (movie_id, marked_at) IN ({placeholders})",
+                       [value for pair in chunk for value in pair])
+    connection.commit()
+    cursor.close()
+    connection.close()
+    click.echo(f"Recomputed neighbors of {len(targets)} movie(s) ({len(dirty)} marked dirty), "
+               f"{len(rows)} row(s) in {time.monotonic() - started:.2f}s")
+
+
+@app.cli.command('generate-recommendations')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU core).')
+def generate_recommendations(workers):
+    """Replace every user's recommendations with the collaborative-filtering model's top movies."""
+    if np is None:
+        click.echo("generate-recommendations needs numpy and scipy")
+        raise SystemExit(1)
+    model = recommender_model.get()
+    if model is None:
+        click.echo("Recommendation model has not been trained, run train-recommender first")
+        raise SystemExit(1)
+    config = batch_recommendation_config
+    started = time.monotonic()
+    connection = create_connection()
+    cursor = connection.cursor()
+
+    # Users and movies deleted since training are skipped, their foreign keys would reject the rows
+    cursor.execute("SELECT user_id FROM user")
+    existing_users = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    cursor.execute("SELECT movie_id FROM movie")
+    existing_movies = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    cursor.execute("""
+        SELECT user_id, movie_id FROM watch_history
+        UNION
+        SELECT user_id, movie_id FROM rating
+    """)
+    seen = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    seen_users = id_rows(seen[:, 0], model.user_ids)
+    seen_movies = id_rows(seen[:, 1], model.movie_ids)
+    known = (seen_users >= 0) & (seen_movies >= 0)
+    user_rows = np.flatnonzero(np.isin(model.user_ids, existing_users))
+    seen_matrix = scipy.sparse.csr_matrix(
+        (np.ones(int(known.sum()), dtype=np.int8), (seen_users[known], seen_movies[known])),
+        shape=(len(model.user_ids), len(model.movie_ids)))[user_rows]
+
+    specs = [
+        share_array('user_factors', model.user_factors[user_rows]),
+        share_array('user_ids', model.user_ids[user_rows]),
+        share_array('movie_factors', model.movie_factors),
+        share_array('movie_ids', model.movie_ids),
+        share_array('movie_exists', np.isin(model.movie_ids, existing_movies)),
+        share_array('seen_indptr', seen_matrix.indptr),
+        share_array('seen_indices', seen_matrix.indices)
+    ]
+    written_users = written_rows = 0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers or config['workers'],
+                                                    initializer=attach_shared_arrays,
+                                                    initargs=(specs, model.mean)) as executor:
+            starts = list(range(0, len(user_rows), config['batch_users']))
+            ends = [min(start + config['batch_users'], len(user_rows)) for start in starts]
+            for user_ids, movies in executor.map(recommend_user_range, starts, ends, [config['top_k']] * len(starts)):
+                # Each chunk of users is replaced in its own transaction, rows are inserted in rank order
+                rows = [(int(user_id), int(movie_id)) for user_id, ranked in zip(user_ids, movies)
+                        for movie_id in ranked if movie_id >= 0]
+                placeholders = ', '.join(['%s'] * len(user_ids))
+                cursor.execute(f"DELETE FROM recommendation WHERE user_id IN ({placeholders})",
+                               [int(user_id) for user_id in user_ids])
+                chunked_executemany(cursor, "INSERT INTO recommendation (user_id, movie_id) VALUES (%s, %s)", rows)
+                connection.commit()
+                written_users += len(user_ids)
+                written_rows += len(rows)
+    finally:
+        for memory, _ in list(shared_arrays.values()):
+            memory.close()
+            memory.unlink()
+        shared_arrays.clear()
+        cursor.close()
+        connection.close()
+
+    elapsed = time.monotonic() - started
+    click.echo(f"Wrote {written_rows} recommendation(s) for {written_users} user(s) in {elapsed:.2f}s "
+               f"({written_users / elapsed:.1f} users/s)")
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux, for the children it is the largest single worker
+        click.echo(f"Peak memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB main process, "
+                   f"{resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.1f} MB largest worker")
+
+
+@app.cli.command('build-ann-index')
+@click.option('--sample-users', type=int, default=200, help='Users whose exact top-K the index recall is measured against.')
+def build_ann_index(sample_users):
+    """Build the IVF index over the recommender's movie factors and report recall and latency per nprobe."""
+    if np is None:
+        click.echo("build-ann-index needs numpy and scipy")
+        raise SystemExit(1)
+    model = recommender_model.get()
+    if model is None:
+        click.echo("Recommendation model has not been trained, run train-recommender first")
+        raise SystemExit(1)
+    started = time.monotonic()
+    index = IVFIndex.build(model.movie_ids, model.movie_factors, ann_config['lists'], ann_config['kmeans_iterations'],
+                           ann_config['seed'])
+    index.info['model_id'] = model.model_id
+    index.info['trained_at'] = model.info.get('trained_at')
+    index.save(ann_config['index_dir'])
+    click.echo(f"Indexed {index.info['movies']} movie(s) in {index.info['lists']} list(s) "
+               f"in {time.monotonic() - started:.2f}s, saved to {ann_config['index_dir']}")
+
+    k = min(recommender_config['top_k'], len(model.movie_ids))
+    users = np.random.default_rng(ann_config['seed']).choice(
+        len(model.user_ids), min(sample_users, len(model.user_ids)), replace=False)
+    exact = [set(np.argpartition(-(model.movie_factors @ model.user_factors[user]), k - 1)[:k]) for user in users]
+    exact = [{int(model.movie_ids[i]) for i in top} for top in exact]
+    nprobe = 1
+    while True:
+        started = time.perf_counter()
+        found = [index.search(model.user_factors[user], k, nprobe)[0] for user in users]
+        latency_ms = (time.perf_counter() - started) / max(len(users), 1) * 1000
+        recall = np.mean([len(expected & {movie_id for movie_id, _ in result}) / k
+                          for expected, result in zip(exact, found)]) if len(users) else 0.0
+        click.echo(f"nprobe={nprobe}: recall@{k} {recall:.3f}, {latency_ms:.3f} ms/query")
+        if nprobe >= index.info['lists']:
+            break
+        nprobe = min(nprobe * 2, index.info['lists'])
+
+
+@app.cli.command('build-analytics-snapshot')
+def build_analytics_snapshot():
+    """Write a new columnar analytics snapshot, which the running workers pick up on their next refresh."""
+    if np is None:
+        click.echo("build-analytics-snapshot needs numpy")
+        raise SystemExit(1)
+    started = time.monotonic()
+    connection = create_connection()
+    cursor = connection.cursor()
+    columns = GenreColumns.build(cursor)
+    cursor.close()
+    connection.close()
+    columns.save(analytics_snapshot.directory)
+    click.echo(f"Snapshot of {columns.info['movies']} movie(s), {len(columns.info['genres'])} genre(s) and "
+               f"{columns.info['memberships']} genre assignment(s) built in {time.monotonic() - started:.2f}s, "
+               f"saved to {analytics_snapshot.directory}")
+
+
     
 #user table's endpoints
 
@@ -264,25 +3291,562 @@ def get_all_users(current_user):
       - User
     security:
       - BearerAuth: []
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of users to return
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
+      - name: ids
+        in: query
+        required: false
+        schema:
+          type: string
+          example: 3,1,2
+        description: Comma separated ids (at most 100) to look up instead of paging, returned in the requested order
+    responses:
+      200:
+        description: One page of users, or the requested users and the ids that do not exist when ids is given
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                users:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      user_id:
+                        type: integer
+                      user_name:
+                        type: string
+                      email:
+                        type: string
+                      preferences:
+                        type: string
+                        nullable: true
+                next_cursor:
+                  type: string
+                  nullable: true
+                missing:
+                  type: array
+                  items:
+                    type: integer
+      400:
+        description: Invalid cursor or ids
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Invalid cursor
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    try:
+        ids = get_id_list()
+        after, limit = get_page_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if ids is not None:
+        try:
+            users, missing = lookup_by_ids(
+                ids, "SELECT user_id, user_name, email, preferences FROM user WHERE user_id IN ({placeholders})",
+                lambda user: {'user_id': user[0], 'user_name': user[1], 'email': user[2], 'preferences': user[3]})
+            return jsonify({'users': users, 'missing': missing}), 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    try:
+        connection = create_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        users, has_more = fetch_page(cursor, queries['get_all_users'], (after or 0,), limit)
+
+        cursor.close()
+        connection.close()
+
+        next_cursor = encode_cursor(users[-1]['user_id']) if has_more else None
+        return jsonify({'users': users, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/users/<int:user_id>', methods=['GET'])
+@token_required
+def get_user_by_id(current_user, user_id):
+    """
+    Get User by ID
+    ---
+    tags:
+      - User
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: user_id
+        in: path
+        required: true
+        description: ID of the user
+        schema:
+          type: integer
+    responses:
+      200:
+        description: User details
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                user_id:
+                  type: integer
+                user_name:
+                  type: string
+                email:
+                  type: string
+                preferences:
+                  type: string
+                  nullable: true
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      404:
+        description: User not found
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: User not found
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if current_user != user_id:
+        return jsonify({'message': 'Access denied'}), 403
+    try:
+        connection = create_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        query = queries['get_user_by_id']
+        cursor.execute(query, (user_id,))
+        user = cursor.fetchone()
+
+        cursor.close()
+        connection.close()
+
+        if user:
+            return jsonify(user), 200
+        else:
+            return jsonify({'message': 'User not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/users/<int:user_id>', methods=['PUT'])
+@token_required
+def update_user(current_user, user_id):
+    """
+    Update User
+    ---
+    tags:
+      - User
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: user_id
+        in: path
+        required: true
+        description: ID of the user
+        schema:
+          type: integer
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              user_name:
+                type: string
+                example: new_username
+              email:
+                type: string
+                example: new_email@example.com
+              preferences:
+                type: string
+                example: action, comedy
+    responses:
+      200:
+        description: User updated successfully
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: User updated successfully
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      404:
+        description: User not found
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: User not found
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if current_user != user_id:
+        return jsonify({'message': 'Access denied'}), 403
+
+    data = request.get_json()
+    user_name = data.get('user_name')
+    email = data.get('email')
+    preferences = data.get('preferences')
+
+    try:
+        connection = create_connection()
+        cursor = connection.cursor()
+
+        query = "UPDATE user SET user_name = %s, email = %s, preferences = %s WHERE user_id = %s"
+        cursor.execute(query, (user_name, email, preferences, user_id))
+
+        if cursor.rowcount > 0:
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return jsonify({'message': 'User updated successfully'}), 200
+        else:
+            cursor.close()
+            connection.close()
+            return jsonify({'message': 'User not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/users/<int:user_id>', methods=['DELETE'])
+@token_required
+def delete_user(current_user, user_id):
+    """
+    Delete User
+    ---
+    tags:
+      - User
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: user_id
+        in: path
+        required: true
+        description: ID of the user
+        schema:
+          type: integer
+    responses:
+      200:
+        description: User deleted successfully
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: User deleted successfully
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      404:
+        description: User not found
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: User not found
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if current_user != user_id:
+        return jsonify({'message': 'Access denied'}), 403
+    if user_id == 1:
+        return jsonify({'message': 'Admin user cannot be deleted'}), 403
+    try:
+        connection = create_connection()
+        cursor = connection.cursor()
+
+        # The user's ratings are removed by ON DELETE CASCADE, take them out of the rating summary first
+        query = """
+            UPDATE movie_rating_summary s
+            JOIN (
+                SELECT movie_id, COUNT(*) AS rating_count, SUM(score) AS rating_sum
+                FROM rating
+                WHERE user_id = %s
+                GROUP BY movie_id
+            ) AS u ON s.movie_id = u.movie_id
+            SET s.rating_count = s.rating_count - u.rating_count, s.rating_sum = s.rating_sum - u.rating_sum
+        """
+        cursor.execute(query, (user_id,))
+        query = """
+            INSERT INTO similarity_dirty_movie (movie_id)
+            SELECT movie_id FROM (
+                SELECT movie_id FROM rating WHERE user_id = %s
+                UNION
+                SELECT movie_id FROM watch_history WHERE user_id = %s
+            ) AS touched
+            ON DUPLICATE KEY UPDATE marked_at = CURRENT_TIMESTAMP(6)
+        """
+        cursor.execute(query, (user_id, user_id))
+
+        query = "DELETE FROM user WHERE user_id = %s"
+        cursor.execute(query, (user_id,))
+
+        if cursor.rowcount > 0:
+            connection.commit()
+            cursor.close()
+            connection.close()
+            invalidate_ratings()
+            return jsonify({'message': 'User deleted successfully'}), 200
+        else:
+            cursor.close()
+            connection.close()
+            return jsonify({'message': 'User not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+#movie table's endpoints
+
+# 1. Create a Movie (Admin Only)
+@app.route('/movies', methods=['POST'])
+@token_required
+def create_movie(current_user):
+    """
+    Create a Movie
+    ---
+    tags:
+      - Movie
+    security:
+      - BearerAuth: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              title:
+                type: string
+                example: Inception
+              description:
+                type: string
+                example: A mind-bending thriller about dreams within dreams.
+              duration:
+                type: integer
+                example: 148
+    responses:
+      201:
+        description: Movie created successfully
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Movie created successfully
+                movie_id:
+                  type: integer
+                  example: 1
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+
+    data = request.get_json()
+    title = data.get('title')
+    description = data.get('description')
+    duration = data.get('duration')
+
+    try:
+        connection = create_connection()
+        cursor = connection.cursor()
+
+        query = "INSERT INTO movie (title, description, duration) VALUES (%s, %s, %s)"
+        cursor.execute(query, (title, description, duration))
+        connection.commit()
+
+        movie_id = cursor.lastrowid
+        cursor.close()
+        connection.close()
+        invalidate_movie(movie_id)
+        search_index.add(movie_id, title, description)
+
+        return jsonify({'message': 'Movie created successfully', 'movie_id': movie_id}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 2. Get All Movies (Any Logged-in User)
+@app.route('/movies', methods=['GET'])
+@token_required
+def get_all_movies(current_user):
+    """
+    Get All Movies
+    ---
+    tags:
+      - Movie
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of movies to return
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
+      - name: ids
+        in: query
+        required: false
+        schema:
+          type: string
+          example: 3,1,2
+        description: Comma separated ids (at most 100) to look up instead of paging, returned in the requested order
     responses:
       200:
-        description: List of all users
+        description: One page of movies, or the requested movies and the ids that do not exist when ids is given
         content:
           application/json:
             schema:
-              type: array
-              items:
-                type: object
-                properties:
-                  user_id:
+              type: object
+              properties:
+                movies:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      movie_id:
+                        type: integer
+                      title:
+                        type: string
+                      description:
+                        type: string
+                      duration:
+                        type: integer
+                next_cursor:
+                  type: string
+                  nullable: true
+                missing:
+                  type: array
+                  items:
                     type: integer
-                  user_name:
-                    type: string
-                  email:
-                    type: string
-                  preferences:
-                    type: string
-                    nullable: true
+      400:
+        description: Invalid cursor or ids
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Invalid cursor
       500:
         description: Internal server error
         content:
@@ -295,66 +3859,85 @@ def get_all_users(current_user):
                   example: Database connection error
     """
     try:
+        ids = get_id_list()
+        after, limit = get_page_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if ids is not None:
+        try:
+            movies, missing = lookup_by_ids(
+                ids, "SELECT * FROM movie WHERE movie_id IN ({placeholders})",
+                lambda movie: {'movie_id': movie[0], 'title': movie[1], 'description': movie[2], 'duration': movie[3]},
+                movie_cache)
+            return jsonify({'movies': movies, 'missing': missing}), 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def load_page():
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "SELECT user_id, user_name, email, preferences FROM user"  # Exclude sensitive fields like password
-        cursor.execute(query)
-        users = cursor.fetchall()
-
+        query = queries['get_all_movies']
+        movies, has_more = fetch_page(cursor, query, (after or 0,), limit)
         cursor.close()
         connection.close()
-        return jsonify(users), 200
+
+        movie_list = []
+        for movie in movies:
+            movie_list.append({
+                'movie_id': movie[0],
+                'title': movie[1],
+                'description': movie[2],
+                'duration': movie[3]
+            })
+
+        next_cursor = encode_cursor(movie_list[-1]['movie_id']) if has_more else None
+        return {'movies': movie_list, 'next_cursor': next_cursor}
+
+    try:
+        return jsonify(shared_cache.get_or_compute(['catalog'], 'movies', [after, limit], load_page)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-
-@app.route('/users/<int:user_id>', methods=['GET'])
+# 3. Get a Single Movie by ID (Any Logged-in User)
+@app.route('/movies/<int:movie_id>', methods=['GET'])
 @token_required
-def get_user_by_id(current_user, user_id):
+def get_movie(current_user, movie_id):
     """
-    Get User by ID
+    Get a Single Movie by ID
     ---
     tags:
-      - User
+      - Movie
     security:
       - BearerAuth: []
     parameters:
-      - name: user_id
+      - name: movie_id
         in: path
         required: true
-        description: ID of the user
+        description: ID of the movie
         schema:
           type: integer
     responses:
       200:
-        description: User details
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                user_id:
-                  type: integer
-                user_name:
-                  type: string
-                email:
-                  type: string
-                preferences:
-                  type: string
-                  nullable: true
-      403:
-        description: Access denied
+        description: Movie details
         content:
           application/json:
             schema:
               type: object
               properties:
-                message:
-                  type: string
-                  example: Access denied
+                movie:
+                  type: object
+                  properties:
+                    movie_id:
+                      type: integer
+                    title:
+                      type: string
+                    description:
+                      type: string
+                    duration:
+                      type: integer
       404:
-        description: User not found
+        description: Movie not found
         content:
           application/json:
             schema:
@@ -362,7 +3945,7 @@ def get_user_by_id(current_user, user_id):
               properties:
                 message:
                   type: string
-                  example: User not found
+                  example: Movie not found
       500:
         description: Internal server error
         content:
@@ -374,42 +3957,49 @@ def get_user_by_id(current_user, user_id):
                   type: string
                   example: Database connection error
     """
-    if current_user != user_id:
-        return jsonify({'message': 'Access denied'}), 403
+    movie_data = movie_cache.get(movie_id)
+    if movie_data is not None:
+        return jsonify({'movie': movie_data}), 200
     try:
         connection = create_connection()
-        cursor = connection.cursor(dictionary=True)
-
-        query = "SELECT user_id, user_name, email, preferences FROM user WHERE user_id = %s"
-        cursor.execute(query, (user_id,))
-        user = cursor.fetchone()
+        cursor = connection.cursor()
 
+        query = queries['get_movie']
+        cursor.execute(query, (movie_id,))
+        movie = cursor.fetchone()
         cursor.close()
         connection.close()
 
-        if user:
-            return jsonify(user), 200
+        if movie:
+            movie_data = {
+                'movie_id': movie[0],
+                'title': movie[1],
+                'description': movie[2],
+                'duration': movie[3]
+            }
+            movie_cache.set(movie_id, movie_data)
+            return jsonify({'movie': movie_data}), 200
         else:
-            return jsonify({'message': 'User not found'}), 404
+            return jsonify({'message': 'Movie not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-
-@app.route('/users/<int:user_id>', methods=['PUT'])
+# 4. Update a Movie (Admin Only)
+@app.route('/movies/<int:movie_id>', methods=['PUT'])
 @token_required
-def update_user(current_user, user_id):
+def update_movie(current_user, movie_id):
     """
-    Update User
+    Update a Movie
     ---
     tags:
-      - User
+      - Movie
     security:
       - BearerAuth: []
     parameters:
-      - name: user_id
+      - name: movie_id
         in: path
         required: true
-        description: ID of the user
+        description: ID of the movie
         schema:
           type: integer
     requestBody:
@@ -419,18 +4009,18 @@ def update_user(current_user, user_id):
           schema:
             type: object
             properties:
-              user_name:
-                type: string
-                example: new_username
-              email:
+              title:
                 type: string
-                example: new_email@example.com
-              preferences:
+                example: Updated Movie Title
+              description:
                 type: string
-                example: action, comedy
+                example: Updated movie description.
+              duration:
+                type: integer
+                example: 120
     responses:
       200:
-        description: User updated successfully
+        description: Movie updated successfully
         content:
           application/json:
             schema:
@@ -438,7 +4028,7 @@ def update_user(current_user, user_id):
               properties:
                 message:
                   type: string
-                  example: User updated successfully
+                  example: Movie updated successfully
       403:
         description: Access denied
         content:
@@ -450,7 +4040,7 @@ def update_user(current_user, user_id):
                   type: string
                   example: Access denied
       404:
-        description: User not found
+        description: Movie not found
         content:
           application/json:
             schema:
@@ -458,7 +4048,7 @@ def update_user(current_user, user_id):
               properties:
                 message:
                   type: string
-                  example: User not found
+                  example: Movie not found
       500:
         description: Internal server error
         content:
@@ -470,54 +4060,56 @@ def update_user(current_user, user_id):
                   type: string
                   example: Database connection error
     """
-    if current_user != user_id:
+    if current_user != 1:
         return jsonify({'message': 'Access denied'}), 403
 
     data = request.get_json()
-    user_name = data.get('user_name')
-    email = data.get('email')
-    preferences = data.get('preferences')
+    title = data.get('title')
+    description = data.get('description')
+    duration = data.get('duration')
 
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "UPDATE user SET user_name = %s, email = %s, preferences = %s WHERE user_id = %s"
-        cursor.execute(query, (user_name, email, preferences, user_id))
+        query = "UPDATE movie SET title = %s, description = %s, duration = %s WHERE movie_id = %s"
+        cursor.execute(query, (title, description, duration, movie_id))
 
         if cursor.rowcount > 0:
             connection.commit()
             cursor.close()
             connection.close()
-            return jsonify({'message': 'User updated successfully'}), 200
+            invalidate_movie(movie_id)
+            search_index.add(movie_id, title, description)
+            return jsonify({'message': 'Movie updated successfully'}), 200
         else:
             cursor.close()
             connection.close()
-            return jsonify({'message': 'User not found'}), 404
+            return jsonify({'message': 'Movie not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-
-@app.route('/users/<int:user_id>', methods=['DELETE'])
+# 5. Delete a Movie (Admin Only)
+@app.route('/movies/<int:movie_id>', methods=['DELETE'])
 @token_required
-def delete_user(current_user, user_id):
+def delete_movie(current_user, movie_id):
     """
-    Delete User
+    Delete a Movie
     ---
     tags:
-      - User
+      - Movie
     security:
       - BearerAuth: []
     parameters:
-      - name: user_id
+      - name: movie_id
         in: path
         required: true
-        description: ID of the user
+        description: ID of the movie
         schema:
           type: integer
     responses:
       200:
-        description: User deleted successfully
+        description: Movie deleted successfully
         content:
           application/json:
             schema:
@@ -525,7 +4117,7 @@ def delete_user(current_user, user_id):
               properties:
                 message:
                   type: string
-                  example: User deleted successfully
+                  example: Movie deleted successfully
       403:
         description: Access denied
         content:
@@ -537,7 +4129,7 @@ def delete_user(current_user, user_id):
                   type: string
                   example: Access denied
       404:
-        description: User not found
+        description: Movie not found
         content:
           application/json:
             schema:
@@ -545,7 +4137,7 @@ def delete_user(current_user, user_id):
               properties:
                 message:
                   type: string
-                  example: User not found
+                  example: Movie not found
       500:
         description: Internal server error
         content:
@@ -557,61 +4149,212 @@ def delete_user(current_user, user_id):
                   type: string
                   example: Database connection error
     """
-    if current_user != user_id:
+    if current_user != 1:
         return jsonify({'message': 'Access denied'}), 403
-    if user_id == 1:
-        return jsonify({'message': 'Admin user cannot be deleted'}), 403
+
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "DELETE FROM user WHERE user_id = %s"
-        cursor.execute(query, (user_id,))
+        query = "DELETE FROM movie WHERE movie_id = %s"
+        cursor.execute(query, (movie_id,))
 
         if cursor.rowcount > 0:
             connection.commit()
             cursor.close()
             connection.close()
-            return jsonify({'message': 'User deleted successfully'}), 200
+            invalidate_movie(movie_id)
+            search_index.remove(movie_id)
+            return jsonify({'message': 'Movie deleted successfully'}), 200
         else:
             cursor.close()
             connection.close()
-            return jsonify({'message': 'User not found'}), 404
+            return jsonify({'message': 'Movie not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
-#movie table's endpoints
 
-# 1. Create a Movie (Admin Only)
-@app.route('/movies', methods=['POST'])
+# 6. Bulk-create Movies (Admin Only)
+def read_bulk_items():
+    # Yields the items of a JSON array body, or of an NDJSON body one line at a time without reading it all first;
+    # a line that is not valid JSON is yielded as the ValueError so that only that row is rejected
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+    else:
+        data = request.get_json()
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array')
+        yield from data
+
+
+def validate_bulk_movie(item):
+    if isinstance(item, ValueError):
+        return f'Invalid JSON: {item}'
+    if not isinstance(item, dict):
+        return 'Each movie must be a JSON object'
+    title = item.get('title')
+    if not isinstance(title, str) or not title.strip() or len(title) > 200:
+        return 'title must be a non-empty string of at most 200 characters'
+    if item.get('description') is not None and not isinstance(item['description'], str):
+        return 'description must be a string'
+    duration = item.get('duration')
+    if duration is not None and (not isinstance(duration, int) or isinstance(duration, bool) or duration < 0):
+        return 'duration must be a non-negative integer'
+    genres = item.get('genres', [])
+    if not isinstance(genres, list) or not all(isinstance(name, str) and 0 < len(name.strip()) <= 100 for name in genres):
+        return 'genres must be a list of genre names of at most 100 characters'
+    return None
+
+
+def lookup_genre_ids(cursor, names):
+    # Matches the names in SQL so the genre_name collation decides equality (case, trailing spaces, accents),
+    # returning {name as given: genre_id}
+    names_table = ' UNION ALL '.join(['SELECT %s AS genre_name'] * len(names))
+    query = f"SELECT n.genre_name, g.genre_id FROM ({names_table}) AS n JOIN genre g ON g.genre_name = n.genre_name"
+    cursor.execute(query, names)
+    return dict(cursor.fetchall())
+
+
+def resolve_genre_ids(cursor, genre_names):
+    # Returns ({stripped name: genre_id}, number of genres created), creating the missing genres with one multi-row INSERT
+    names = list(dict.fromkeys(name.strip() for name in genre_names))
+    if not names:
+        return {}, 0
+    genre_ids = lookup_genre_ids(cursor, names)
+
+    missing = [name for name in names if name not in genre_ids]
+    if missing:
+        cursor.executemany("INSERT IGNORE INTO genre (genre_name) VALUES (%s)", [(name,) for name in missing])
+        created = cursor.rowcount
+        genre_ids.update(lookup_genre_ids(cursor, missing))
+        return genre_ids, created
+    return genre_ids, 0
+
+
+def insert_movie_chunk(connection, chunk, id_increment):
+    # Inserts one chunk of (index, movie) in a single transaction and returns the created movie ids in order.
+    # The chunk holds write locks on the tables it touches, so no other statement can take ids while its multi-row
+    # INSERT runs: the rows get consecutive ids (spaced by id_increment, the server's auto_increment_increment)
+    # starting at the id reported for the first row, whatever innodb_autoinc_lock_mode is
+    cursor = connection.cursor()
+    try:
+        # LOCK TABLES commits any open transaction, so it comes first; lookup_genre_ids reads genre as g
+        cursor.execute("LOCK TABLES movie WRITE, movie_genre WRITE, genre WRITE, genre AS g READ")
+        genre_ids, genres_created = resolve_genre_ids(cursor, [name for _, movie in chunk for name in movie.get('genres', [])])
+
+        # executemany turns this into one multi-row INSERT
+        cursor.executemany("INSERT INTO movie (title, description, duration) VALUES (%s, %s, %s)",
+                           [(movie['title'], movie.get('description'), movie.get('duration')) for _, movie in chunk])
+        movie_ids = [cursor.lastrowid + position * id_increment for position in range(len(chunk))]
+
+        movie_genres = {(movie_id, genre_ids[name.strip()])
+                        for movie_id, (_, movie) in zip(movie_ids, chunk) for name in movie.get('genres', [])}
+        if movie_genres:
+            cursor.executemany("INSERT INTO movie_genre (movie_id, genre_id) VALUES (%s, %s)", sorted(movie_genres))
+
+        connection.commit()
+        return movie_ids, genres_created
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        # Table locks outlive the transaction and the connection goes back to the pool, so they are always released
+        cursor.execute("UNLOCK TABLES")
+        cursor.close()
+
+
+@app.route('/movies/bulk', methods=['POST'])
 @token_required
-def create_movie(current_user):
+def create_movies_bulk(current_user):
     """
-    Create a Movie
+    Bulk-create Movies (Admin Only)
     ---
     tags:
       - Movie
     security:
       - BearerAuth: []
+    parameters:
+      - name: chunk_size
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 1000
+          maximum: 5000
+        description: Number of movies inserted per statement and transaction
     requestBody:
       required: true
+      description: A JSON array of movies, or one movie object per line with Content-Type application/x-ndjson
       content:
         application/json:
           schema:
-            type: object
-            properties:
-              title:
-                type: string
-                example: Inception
-              description:
-                type: string
-                example: A mind-bending thriller about dreams within dreams.
-              duration:
-                type: integer
-                example: 148
+            type: array
+            items:
+              type: object
+              properties:
+                title:
+                  type: string
+                  example: Inception
+                description:
+                  type: string
+                  example: A mind-bending thriller about dreams within dreams.
+                duration:
+                  type: integer
+                  example: 148
+                genres:
+                  type: array
+                  items:
+                    type: string
+                  example: [Action, Sci-Fi]
+        application/x-ndjson:
+          schema:
+            type: string
     responses:
-      201:
-        description: Movie created successfully
+      200:
+        description: Per-row results and throughput of the import
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                created:
+                  type: integer
+                rejected:
+                  type: integer
+                  description: Rows that failed validation
+                failed:
+                  type: integer
+                  description: Valid rows whose chunk could not be written
+                genres_created:
+                  type: integer
+                results:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      index:
+                        type: integer
+                      status:
+                        type: string
+                        enum: [created, rejected, failed]
+                      movie_id:
+                        type: integer
+                      error:
+                        type: string
+                elapsed_seconds:
+                  type: number
+                  format: float
+                rows_per_second:
+                  type: number
+                  format: float
+      400:
+        description: The body is not a JSON array
         content:
           application/json:
             schema:
@@ -619,10 +4362,7 @@ def create_movie(current_user):
               properties:
                 message:
                   type: string
-                  example: Movie created successfully
-                movie_id:
-                  type: integer
-                  example: 1
+                  example: Expected a JSON array
       403:
         description: Access denied
         content:
@@ -647,59 +4387,165 @@ def create_movie(current_user):
     if current_user != 1:
         return jsonify({'message': 'Access denied'}), 403
 
-    data = request.get_json()
-    title = data.get('title')
-    description = data.get('description')
-    duration = data.get('duration')
+    chunk_size = request.args.get('chunk_size', default=bulk_config['chunk_size'], type=int)
+    chunk_size = max(1, min(chunk_size, bulk_config['max_chunk_size']))
+    started = time.monotonic()
+    results = []
+    counts = {'created': 0, 'rejected': 0, 'failed': 0}
+    genres_created = 0
+
+    def flush(chunk):
+        nonlocal genres_created
+        try:
+            movie_ids, created = insert_movie_chunk(connection, chunk, id_increment)
+        except Exception as e:
+            counts['failed'] += len(chunk)
+            results.extend({'index': index, 'status': 'failed', 'error': str(e)} for index, _ in chunk)
+            return
+        genres_created += created
+        counts['created'] += len(chunk)
+        for (_, item), movie_id in zip(chunk, movie_ids):
+            search_index.add(movie_id, item.get('title'), item.get('description'))
+        results.extend({'index': index, 'status': 'created', 'movie_id': movie_id}
+                       for (index, _), movie_id in zip(chunk, movie_ids))
 
     try:
         connection = create_connection()
         cursor = connection.cursor()
-
-        query = "INSERT INTO movie (title, description, duration) VALUES (%s, %s, %s)"
-        cursor.execute(query, (title, description, duration))
-        connection.commit()
-
-        movie_id = cursor.lastrowid
+        cursor.execute("SELECT @@auto_increment_increment")
+        id_increment = cursor.fetchone()[0]
         cursor.close()
-        connection.close()
 
-        return jsonify({'message': 'Movie created successfully', 'movie_id': movie_id}), 201
+        chunk = []
+        for index, item in enumerate(read_bulk_items()):
+            error = validate_bulk_movie(item)
+            if error:
+                counts['rejected'] += 1
+                results.append({'index': index, 'status': 'rejected', 'error': error})
+                continue
+            chunk.append((index, item))
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+        connection.close()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
-# 2. Get All Movies (Any Logged-in User)
-@app.route('/movies', methods=['GET'])
+    finally:
+        if counts['created']:
+            if genres_created:
+                invalidate_genres()
+            else:
+                invalidate_catalog()
+
+    elapsed = time.monotonic() - started
+    results.sort(key=lambda result: result['index'])
+    return jsonify({
+        **counts,
+        'genres_created': genres_created,
+        'results': results,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(counts['created'] / elapsed, 1) if elapsed > 0 else None
+    }), 200
+
+# 7. Get Everything a Movie Page Shows (Any Logged-in User)
+@app.route('/movies/<int:movie_id>/detail', methods=['GET'])
 @token_required
-def get_all_movies(current_user):
+def get_movie_detail(current_user, movie_id):
     """
-    Get All Movies
+    Get a Movie with its Genres, Rating Summary and First Page of Reviews
     ---
     tags:
       - Movie
     security:
       - BearerAuth: []
+    parameters:
+      - name: movie_id
+        in: path
+        required: true
+        description: ID of the movie
+        schema:
+          type: integer
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of reviews to return, further pages come from /movies/{movie_id}/reviews
     responses:
       200:
-        description: List of all movies
+        description: Movie details
         content:
           application/json:
             schema:
               type: object
               properties:
-                movies:
+                movie:
+                  type: object
+                  properties:
+                    movie_id:
+                      type: integer
+                    title:
+                      type: string
+                    description:
+                      type: string
+                    duration:
+                      type: integer
+                genres:
                   type: array
                   items:
                     type: object
                     properties:
-                      movie_id:
+                      genre_id:
                         type: integer
-                      title:
-                        type: string
-                      description:
+                      genre_name:
                         type: string
-                      duration:
+                ratings:
+                  type: object
+                  properties:
+                    count:
+                      type: integer
+                      example: 12
+                    average:
+                      type: number
+                      nullable: true
+                      example: 3.85
+                    histogram:
+                      type: object
+                      description: Number of ratings per whole star (a 3.5 counts as 3)
+                      example: {"1": 0, "2": 1, "3": 4, "4": 5, "5": 2}
+                reviews:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      review_id:
                         type: integer
+                      user_id:
+                        type: integer
+                      review_text:
+                        type: string
+                      user_name:
+                        type: string
+                next_cursor:
+                  type: string
+                  nullable: true
+                  description: Cursor for the next page of /movies/{movie_id}/reviews
+      404:
+        description: Movie not found
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Movie not found
       500:
         description: Internal server error
         content:
@@ -711,35 +4557,61 @@ def get_all_movies(current_user):
                   type: string
                   example: Database connection error
     """
+    limit = request.args.get('limit', default=pagination_config['default_limit'], type=int)
+    limit = max(1, min(limit, pagination_config['max_limit']))
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "SELECT * FROM movie"
-        cursor.execute(query)
-        movies = cursor.fetchall()
+        # The rating summary is read with the movie row, so a missing movie costs a single query
+        cursor.execute(queries['get_movie_detail'], (movie_id,))
+        movie = cursor.fetchone()
+        if not movie:
+            cursor.close()
+            connection.close()
+            return jsonify({'message': 'Movie not found'}), 404
+        movie_data = {'movie_id': movie[0], 'title': movie[1], 'description': movie[2], 'duration': movie[3]}
+        movie_cache.set(movie_id, movie_data)
+        rating_count = movie[4]
+
+        genre_list = movie_genres_cache.get(movie_id)
+        if genre_list is None:
+            cursor.execute(queries['get_genres_of_movie'], (movie_id,))
+            genre_list = [{'genre_id': genre[0], 'genre_name': genre[1]} for genre in cursor.fetchall()]
+            movie_genres_cache.set(movie_id, genre_list)
+
+        histogram = {str(star): 0 for star in range(1, 6)}
+        if rating_count:
+            cursor.execute(queries['rating_histogram'], (movie_id,))
+            for star, count in cursor.fetchall():
+                histogram[str(int(star))] = count
+
+        reviews, has_more = fetch_page(cursor, queries['first_reviews'], (movie_id,), limit)
         cursor.close()
         connection.close()
 
-        movie_list = []
-        for movie in movies:
-            movie_list.append({
-                'movie_id': movie[0],
-                'title': movie[1],
-                'description': movie[2],
-                'duration': movie[3]
-            })
-
-        return jsonify({'movies': movie_list}), 200
+        review_list = [{'review_id': review[0], 'user_id': review[1], 'review_text': review[2], 'user_name': review[3]}
+                       for review in reviews]
+        return jsonify({
+            'movie': movie_data,
+            'genres': genre_list,
+            'ratings': {
+                'count': rating_count,
+                'average': round(float(movie[5]), 2) if rating_count else None,
+                'histogram': histogram
+            },
+            'reviews': review_list,
+            'next_cursor': encode_cursor(review_list[-1]['review_id']) if has_more else None
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# 3. Get a Single Movie by ID (Any Logged-in User)
-@app.route('/movies/<int:movie_id>', methods=['GET'])
+# 8. Get Similar Movies (Any Logged-in User)
+@app.route('/movies/<int:movie_id>/similar', methods=['GET'])
 @token_required
-def get_movie(current_user, movie_id):
+def get_similar_movies(current_user, movie_id):
     """
-    Get a Single Movie by ID
+    Get Movies Similar to a Movie
     ---
     tags:
       - Movie
@@ -752,25 +4624,40 @@ def get_movie(current_user, movie_id):
         description: ID of the movie
         schema:
           type: integer
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 20
+          maximum: 20
+        description: Number of similar movies to return
     responses:
       200:
-        description: Movie details
+        description: Most similar movies first, as of the last rebuild-similarity run
         content:
           application/json:
             schema:
               type: object
               properties:
-                movie:
-                  type: object
-                  properties:
-                    movie_id:
-                      type: integer
-                    title:
-                      type: string
-                    description:
-                      type: string
-                    duration:
-                      type: integer
+                similar:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      movie_id:
+                        type: integer
+                      title:
+                        type: string
+                      similarity:
+                        type: number
+                        example: 0.42
+                      rating_similarity:
+                        type: number
+                        description: Adjusted cosine of the two movies' ratings
+                      co_watch_count:
+                        type: integer
+                        description: Number of users who watched both movies
       404:
         description: Movie not found
         content:
@@ -792,86 +4679,87 @@ def get_movie(current_user, movie_id):
                   type: string
                   example: Database connection error
     """
+    limit = request.args.get('limit', default=similarity_config['neighbors'], type=int)
+    limit = max(1, min(limit, similarity_config['neighbors']))
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "SELECT * FROM movie WHERE movie_id = %s"
-        cursor.execute(query, (movie_id,))
-        movie = cursor.fetchone()
+        # The neighbor list is a primary key range of at most `neighbors` rows, already in rank order
+        cursor.execute(queries['get_similar_movies'], (movie_id, limit))
+        similar = cursor.fetchall()
+        if not similar:
+            cursor.execute("SELECT movie_id FROM movie WHERE movie_id = %s", (movie_id,))
+            if not cursor.fetchone():
+                cursor.close()
+                connection.close()
+                return jsonify({'message': 'Movie not found'}), 404
         cursor.close()
         connection.close()
 
-        if movie:
-            movie_data = {
-                'movie_id': movie[0],
-                'title': movie[1],
-                'description': movie[2],
-                'duration': movie[3]
-            }
-            return jsonify({'movie': movie_data}), 200
-        else:
-            return jsonify({'message': 'Movie not found'}), 404
+        similar_list = [{'movie_id': row[0], 'title': row[1], 'similarity': round(row[2], 4),
+                         'rating_similarity': round(row[3], 4), 'co_watch_count': row[4]} for row in similar]
+        return jsonify({'similar': similar_list}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# 4. Update a Movie (Admin Only)
-@app.route('/movies/<int:movie_id>', methods=['PUT'])
+# 9. Search Movies (Any Logged-in User)
+@app.route('/movies/search', methods=['GET'])
 @token_required
-def update_movie(current_user, movie_id):
+def search_movies(current_user):
     """
-    Update a Movie
+    Search Movies by Title and Description
     ---
     tags:
       - Movie
     security:
       - BearerAuth: []
     parameters:
-      - name: movie_id
-        in: path
+      - name: q
+        in: query
         required: true
-        description: ID of the movie
+        schema:
+          type: string
+          example: space horror
+        description: Words to look for, matched after stemming (runs, running and run are the same word)
+      - name: limit
+        in: query
+        required: false
         schema:
           type: integer
-    requestBody:
-      required: true
-      content:
-        application/json:
-          schema:
-            type: object
-            properties:
-              title:
-                type: string
-                example: Updated Movie Title
-              description:
-                type: string
-                example: Updated movie description.
-              duration:
-                type: integer
-                example: 120
+          default: 50
+          maximum: 200
+        description: Number of movies to return
     responses:
       200:
-        description: Movie updated successfully
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                message:
-                  type: string
-                  example: Movie updated successfully
-      403:
-        description: Access denied
+        description: Matching movies, best BM25 score first (title words weigh more than description words)
         content:
           application/json:
             schema:
               type: object
               properties:
-                message:
-                  type: string
-                  example: Access denied
-      404:
-        description: Movie not found
+                movies:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      movie_id:
+                        type: integer
+                      title:
+                        type: string
+                      description:
+                        type: string
+                      duration:
+                        type: integer
+                      score:
+                        type: number
+                total:
+                  type: integer
+                  description: Number of movies matching at least one word
+                took_ms:
+                  type: number
+      400:
+        description: Missing query
         content:
           application/json:
             schema:
@@ -879,7 +4767,7 @@ def update_movie(current_user, movie_id):
               properties:
                 message:
                   type: string
-                  example: Movie not found
+                  example: q is required
       500:
         description: Internal server error
         content:
@@ -891,74 +4779,90 @@ def update_movie(current_user, movie_id):
                   type: string
                   example: Database connection error
     """
-    if current_user != 1:
-        return jsonify({'message': 'Access denied'}), 403
-
-    data = request.get_json()
-    title = data.get('title')
-    description = data.get('description')
-    duration = data.get('duration')
-
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'q is required'}), 400
+    limit = request.args.get('limit', default=pagination_config['default_limit'], type=int)
+    limit = max(1, min(limit, pagination_config['max_limit']))
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        query = "UPDATE movie SET title = %s, description = %s, duration = %s WHERE movie_id = %s"
-        cursor.execute(query, (title, description, duration, movie_id))
-
-        if cursor.rowcount > 0:
-            connection.commit()
-            cursor.close()
-            connection.close()
-            return jsonify({'message': 'Movie updated successfully'}), 200
-        else:
-            cursor.close()
-            connection.close()
-            return jsonify({'message': 'Movie not found'}), 404
+        started = time.perf_counter()
+        matches, total = search_index.search(query, limit)
+        movies = []
+        if matches:
+            scores = dict(matches)
+            movies, _ = lookup_by_ids(
+                [movie_id for movie_id, _ in matches], "SELECT * FROM movie WHERE movie_id IN ({placeholders})",
+                lambda movie: {'movie_id': movie[0], 'title': movie[1], 'description': movie[2], 'duration': movie[3]},
+                movie_cache)
+            movies = [{**movie, 'score': round(scores[movie['movie_id']], 4)} for movie in movies]
+        return jsonify({'movies': movies, 'total': total,
+                        'took_ms': round((time.perf_counter() - started) * 1000, 3)}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# 5. Delete a Movie (Admin Only)
-@app.route('/movies/<int:movie_id>', methods=['DELETE'])
+# 10. Autocomplete Movie Titles and Genre Names (Any Logged-in User)
+@app.route('/autocomplete', methods=['GET'])
 @token_required
-def delete_movie(current_user, movie_id):
+def autocomplete_titles(current_user):
     """
-    Delete a Movie
+    Autocomplete Movie Titles and Genre Names
     ---
     tags:
       - Movie
     security:
       - BearerAuth: []
     parameters:
-      - name: movie_id
-        in: path
+      - name: q
+        in: query
         required: true
-        description: ID of the movie
+        schema:
+          type: string
+          example: dark kn
+        description: What has been typed so far, matched against the start of any word of a title or genre name
+      - name: type
+        in: query
+        required: false
+        schema:
+          type: string
+          enum: [movie, genre]
+        description: Only suggest movies or only genres
+      - name: limit
+        in: query
+        required: false
         schema:
           type: integer
+          default: 10
+          maximum: 50
+        description: Number of suggestions
     responses:
       200:
-        description: Movie deleted successfully
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                message:
-                  type: string
-                  example: Movie deleted successfully
-      403:
-        description: Access denied
+        description: Suggestions, most watched first
         content:
           application/json:
             schema:
               type: object
               properties:
-                message:
-                  type: string
-                  example: Access denied
-      404:
-        description: Movie not found
+                suggestions:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      type:
+                        type: string
+                        example: movie
+                      id:
+                        type: integer
+                      label:
+                        type: string
+                        example: The Dark Knight
+                      popularity:
+                        type: integer
+                        description: Watch history entries of the movie, or of the genre's movies
+                took_us:
+                  type: number
+                  description: Lookup time in microseconds
+      400:
+        description: Invalid type
         content:
           application/json:
             schema:
@@ -966,7 +4870,7 @@ def delete_movie(current_user, movie_id):
               properties:
                 message:
                   type: string
-                  example: Movie not found
+                  example: type must be movie or genre
       500:
         description: Internal server error
         content:
@@ -978,25 +4882,16 @@ def delete_movie(current_user, movie_id):
                   type: string
                   example: Database connection error
     """
-    if current_user != 1:
-        return jsonify({'message': 'Access denied'}), 403
-
+    kind = request.args.get('type')
+    if kind not in (None, 'movie', 'genre'):
+        return jsonify({'message': 'type must be movie or genre'}), 400
+    limit = request.args.get('limit', default=autocomplete_config['max_results'], type=int)
+    limit = max(1, min(limit, 50))
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        query = "DELETE FROM movie WHERE movie_id = %s"
-        cursor.execute(query, (movie_id,))
-
-        if cursor.rowcount > 0:
-            connection.commit()
-            cursor.close()
-            connection.close()
-            return jsonify({'message': 'Movie deleted successfully'}), 200
-        else:
-            cursor.close()
-            connection.close()
-            return jsonify({'message': 'Movie not found'}), 404
+        started = time.perf_counter()
+        suggestions = autocomplete.suggest(request.args.get('q', ''), limit, kind)
+        took_us = (time.perf_counter() - started) * 1000000
+        return jsonify({'suggestions': suggestions, 'took_us': round(took_us, 1)}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1075,6 +4970,7 @@ def create_genre(current_user):
         genre_id = cursor.lastrowid
         cursor.close()
         connection.close()
+        invalidate_genres(genre_id)
 
         return jsonify({'message': 'Genre created successfully', 'genre_id': genre_id}), 201
     except Exception as e:
@@ -1091,9 +4987,31 @@ def get_all_genres(current_user):
       - Genre
     security:
       - BearerAuth: []
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of genres to return
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
+      - name: ids
+        in: query
+        required: false
+        schema:
+          type: string
+          example: 3,1,2
+        description: Comma separated ids (at most 100) to look up instead of paging, returned in the requested order
     responses:
       200:
-        description: List of all genres
+        description: One page of genres, or the requested genres and the ids that do not exist when ids is given
         content:
           application/json:
             schema:
@@ -1108,6 +5026,23 @@ def get_all_genres(current_user):
                         type: integer
                       genre_name:
                         type: string
+                next_cursor:
+                  type: string
+                  nullable: true
+                missing:
+                  type: array
+                  items:
+                    type: integer
+      400:
+        description: Invalid cursor or ids
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Invalid cursor
       500:
         description: Internal server error
         content:
@@ -1120,17 +5055,39 @@ def get_all_genres(current_user):
                   example: Database connection error
     """
     try:
+        ids = get_id_list()
+        after, limit = get_page_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if ids is not None:
+        try:
+            genres, missing = lookup_by_ids(
+                ids, "SELECT * FROM genre WHERE genre_id IN ({placeholders})",
+                lambda genre: {'genre_id': genre[0], 'genre_name': genre[1]}, genre_cache)
+            return jsonify({'genres': genres, 'missing': missing}), 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    page = genre_list_cache.get((after, limit))
+    if page is not None:
+        return jsonify(page), 200
+
+    def load_page():
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "SELECT * FROM genre"
-        cursor.execute(query)
-        genres = cursor.fetchall()
+        query = queries['get_all_genres']
+        genres, has_more = fetch_page(cursor, query, (after or 0,), limit)
         cursor.close()
         connection.close()
 
         genre_list = [{'genre_id': genre[0], 'genre_name': genre[1]} for genre in genres]
-        return jsonify({'genres': genre_list}), 200
+        next_cursor = encode_cursor(genre_list[-1]['genre_id']) if has_more else None
+        return {'genres': genre_list, 'next_cursor': next_cursor}
+
+    try:
+        page = shared_cache.get_or_compute(['catalog'], 'genres', [after, limit], load_page)
+        genre_list_cache.set((after, limit), page)
+        return jsonify(page), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1188,11 +5145,14 @@ def get_genre(current_user, genre_id):
                   type: string
                   example: Database connection error
     """
+    genre_data = genre_cache.get(genre_id)
+    if genre_data is not None:
+        return jsonify({'genre': genre_data}), 200
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "SELECT * FROM genre WHERE genre_id = %s"
+        query = queries['get_genre']
         cursor.execute(query, (genre_id,))
         genre = cursor.fetchone()
         cursor.close()
@@ -1200,6 +5160,7 @@ def get_genre(current_user, genre_id):
 
         if genre:
             genre_data = {'genre_id': genre[0], 'genre_name': genre[1]}
+            genre_cache.set(genre_id, genre_data)
             return jsonify({'genre': genre_data}), 200
         else:
             return jsonify({'message': 'Genre not found'}), 404
@@ -1293,6 +5254,7 @@ def update_genre(current_user, genre_id):
             connection.commit()
             cursor.close()
             connection.close()
+            invalidate_genres(genre_id)
             return jsonify({'message': 'Genre updated successfully'}), 200
         else:
             cursor.close()
@@ -1374,6 +5336,7 @@ def delete_genre(current_user, genre_id):
             connection.commit()
             cursor.close()
             connection.close()
+            invalidate_genres(genre_id)
             return jsonify({'message': 'Genre deleted successfully'}), 200
         else:
             cursor.close()
@@ -1457,6 +5420,7 @@ def assign_genre_to_movie(current_user):
 
         cursor.close()
         connection.close()
+        invalidate_movie_genres(movie_id)
 
         return jsonify({'message': 'Genre assigned to movie successfully'}), 201
     except Exception as e:
@@ -1508,23 +5472,21 @@ def get_genres_of_movie(current_user, movie_id):
                   type: string
                   example: Database connection error
     """
+    genre_list = movie_genres_cache.get(movie_id)
+    if genre_list is not None:
+        return jsonify({'genres': genre_list}), 200
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = """
-            SELECT g.genre_id, g.genre_name 
-            FROM genre g
-            JOIN movie_genre mg ON g.genre_id = mg.genre_id
-            WHERE mg.movie_id = %s
-        """
-        cursor.execute(query, (movie_id,))
+        cursor.execute(queries['get_genres_of_movie'], (movie_id,))
         genres = cursor.fetchall()
 
         cursor.close()
         connection.close()
 
         genre_list = [{'genre_id': genre[0], 'genre_name': genre[1]} for genre in genres]
+        movie_genres_cache.set(movie_id, genre_list)
         return jsonify({'genres': genre_list}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1583,13 +5545,7 @@ def get_movies_of_genre(current_user, genre_id):
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = """
-            SELECT m.movie_id, m.title, m.description, m.duration 
-            FROM movie m
-            JOIN movie_genre mg ON m.movie_id = mg.movie_id
-            WHERE mg.genre_id = %s
-        """
-        cursor.execute(query, (genre_id,))
+        cursor.execute(queries['get_movies_of_genre'], (genre_id,))
         movies = cursor.fetchall()
 
         cursor.close()
@@ -1677,13 +5633,14 @@ def remove_genre_from_movie(current_user):
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "DELETE FROM movie_genre WHERE movie_id = %s AND genre_id = %s"
+        query = queries['remove_genre_from_movie']
         cursor.execute(query, (movie_id, genre_id))
 
         if cursor.rowcount > 0:
             connection.commit()
             cursor.close()
             connection.close()
+            invalidate_movie_genres(movie_id)
             return jsonify({'message': 'Genre removed from movie successfully'}), 200
         else:
             cursor.close()
@@ -1692,6 +5649,303 @@ def remove_genre_from_movie(current_user):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# 5. Replace the Genres of Movies
+def parse_genre_assignments(items):
+    # Returns ({movie_id: set of genre_ids}, None) or (None, error) for a list of {movie_id, genre_ids}
+    assignments = {}
+    if not isinstance(items, list) or not items:
+        return None, 'movies must be a non-empty list'
+    for item in items:
+        movie_id = item.get('movie_id') if isinstance(item, dict) else None
+        genre_ids = item.get('genre_ids') if isinstance(item, dict) else None
+        if not isinstance(movie_id, int) or isinstance(movie_id, bool):
+            return None, 'movie_id must be an integer'
+        if not isinstance(genre_ids, list) or not all(isinstance(genre_id, int) and not isinstance(genre_id, bool)
+                                                      for genre_id in genre_ids):
+            return None, 'genre_ids must be a list of integers'
+        if movie_id in assignments:
+            return None, f'Movie {movie_id} is listed more than once'
+        assignments[movie_id] = set(genre_ids)
+    return assignments, None
+
+
+def replace_movie_genres(connection, assignments):
+    # Diffs the requested genre sets against movie_genre and applies the difference in one transaction with
+    # multi-row statements. Returns ({movie_id: (added, removed)}, None) or (None, (message, status)).
+    cursor = connection.cursor()
+    movie_ids = sorted(assignments)
+    missing_movies = set(movie_ids) - existing_ids(cursor, 'movie', 'movie_id', movie_ids)
+    if missing_movies:
+        cursor.close()
+        return None, (f"Movies not found: {', '.join(map(str, sorted(missing_movies)))}", 404)
+    genre_ids = {genre_id for wanted in assignments.values() for genre_id in wanted}
+    missing_genres = genre_ids - existing_ids(cursor, 'genre', 'genre_id', genre_ids)
+    if missing_genres:
+        cursor.close()
+        return None, (f"Genres not found: {', '.join(map(str, sorted(missing_genres)))}", 404)
+
+    current = collections.defaultdict(set)
+    for start in range(0, len(movie_ids), bulk_config['chunk_size']):
+        chunk = movie_ids[start:start + bulk_config['chunk_size']]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"SELECT movie_id, genre_id FROM movie_genre WHERE movie_id IN ({placeholders}) FOR UPDATE", chunk)
+        for movie_id, genre_id in cursor.fetchall():
+            current[movie_id].add(genre_id)
+
+    to_add = sorted((movie_id, genre_id) for movie_id, wanted in assignments.items()
+                    for genre_id in wanted - current[movie_id])
+    to_remove = sorted((movie_id, genre_id) for movie_id, wanted in assignments.items()
+                       for genre_id in current[movie_id] - wanted)
+
+    chunked_executemany(cursor, "INSERT INTO movie_genre (movie_id, genre_id) VALUES (%s, %s)", to_add)
+    for start in range(0, len(to_remove), bulk_config['chunk_size']):
+        chunk = to_remove[start:start + bulk_config['chunk_size']]
+        placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+        cursor.execute(f"DELETE FROM movie_genre WHERE (movie_id, genre_id) IN ({placeholders})",
+                       [value for pair in chunk for value in pair])
+    connection.commit()
+    cursor.close()
+
+    changes = {movie_id: (0, 0) for movie_id in movie_ids}
+    for movie_id, _ in to_add:
+        changes[movie_id] = (changes[movie_id][0] + 1, changes[movie_id][1])
+    for movie_id, _ in to_remove:
+        changes[movie_id] = (changes[movie_id][0], changes[movie_id][1] + 1)
+    for movie_id, (added, removed) in changes.items():
+        if added or removed:
+            movie_genres_cache.pop(movie_id)
+    if to_add or to_remove:
+        invalidate_catalog()
+    return changes, None
+
+
+@app.route('/movies/<int:movie_id>/genres', methods=['PUT'])
+@token_required
+def set_genres_of_movie(current_user, movie_id):
+    """
+    Replace the Genres of a Movie
+    ---
+    tags:
+      - Movie-Genre
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: movie_id
+        in: path
+        required: true
+        description: ID of the movie
+        schema:
+          type: integer
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              genre_ids:
+                type: array
+                items:
+                  type: integer
+                example: [1, 2, 5]
+    responses:
+      200:
+        description: Genres of the movie replaced successfully
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Movie genres updated successfully
+                added:
+                  type: integer
+                removed:
+                  type: integer
+      400:
+        description: Invalid request
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: genre_ids must be a list of integers
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      404:
+        description: Movie or genres not found
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: "Genres not found: 7"
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+
+    data = request.get_json()
+    assignments, error = parse_genre_assignments([{'movie_id': movie_id, 'genre_ids': data.get('genre_ids')}])
+    if error:
+        return jsonify({'message': error}), 400
+
+    try:
+        connection = create_connection()
+        changes, error = replace_movie_genres(connection, assignments)
+        connection.close()
+        if error:
+            return jsonify({'message': error[0]}), error[1]
+        added, removed = changes[movie_id]
+        return jsonify({'message': 'Movie genres updated successfully', 'added': added, 'removed': removed}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/movie-genre/bulk', methods=['PUT'])
+@token_required
+def set_genres_of_movies(current_user):
+    """
+    Replace the Genres of Many Movies
+    ---
+    tags:
+      - Movie-Genre
+    security:
+      - BearerAuth: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            properties:
+              movies:
+                type: array
+                items:
+                  type: object
+                  properties:
+                    movie_id:
+                      type: integer
+                      example: 1
+                    genre_ids:
+                      type: array
+                      items:
+                        type: integer
+                      example: [1, 2]
+    responses:
+      200:
+        description: Genres of every listed movie replaced in one transaction
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Movie genres updated successfully
+                added:
+                  type: integer
+                removed:
+                  type: integer
+                movies:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      movie_id:
+                        type: integer
+                      added:
+                        type: integer
+                      removed:
+                        type: integer
+      400:
+        description: Invalid request
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: movies must be a non-empty list
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      404:
+        description: Movies or genres not found, nothing was changed
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: "Movies not found: 42"
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+
+    data = request.get_json()
+    assignments, error = parse_genre_assignments(data.get('movies'))
+    if error:
+        return jsonify({'message': error}), 400
+
+    try:
+        connection = create_connection()
+        changes, error = replace_movie_genres(connection, assignments)
+        connection.close()
+        if error:
+            return jsonify({'message': error[0]}), error[1]
+        movies = [{'movie_id': movie_id, 'added': added, 'removed': removed}
+                  for movie_id, (added, removed) in changes.items()]
+        return jsonify({
+            'message': 'Movie genres updated successfully',
+            'added': sum(movie['added'] for movie in movies),
+            'removed': sum(movie['removed'] for movie in movies),
+            'movies': movies
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Add a Rating
 @app.route('/ratings', methods=['POST'])
 @token_required
@@ -1751,15 +6005,270 @@ def add_rating(current_user):
 
         query = "INSERT INTO rating (user_id, movie_id, score) VALUES (%s, %s, %s)"
         cursor.execute(query, (current_user, movie_id, score))
+
+        # Add the stored (rounded) score to the movie's summary in the same transaction
+        query = """
+            INSERT INTO movie_rating_summary (movie_id, rating_count, rating_sum)
+            SELECT movie_id, 1, score FROM rating WHERE rating_id = %s
+            ON DUPLICATE KEY UPDATE rating_count = rating_count + 1, rating_sum = rating_sum + VALUES(rating_sum)
+        """
+        cursor.execute(query, (cursor.lastrowid,))
+        mark_similarity_dirty(cursor, [movie_id])
         connection.commit()
 
         cursor.close()
         connection.close()
+        invalidate_ratings([movie_id])
 
         return jsonify({'message': 'Rating added successfully'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Add Ratings in Bulk
+def parse_bulk_rating(item, current_user):
+    # Returns ((user_id, movie_id, score), None) for a valid row or (None, error)
+    if isinstance(item, ValueError):
+        return None, f'Invalid JSON: {item}'
+    if not isinstance(item, dict):
+        return None, 'Each rating must be a JSON object'
+    movie_id = item.get('movie_id')
+    if not isinstance(movie_id, int) or isinstance(movie_id, bool) or movie_id <= 0:
+        return None, 'movie_id must be a positive integer'
+    user_id = item.get('user_id', current_user)
+    if user_id != current_user and current_user != 1:
+        return None, 'Only the admin can rate for other users'
+    if not isinstance(user_id, int) or isinstance(user_id, bool) or user_id <= 0:
+        return None, 'user_id must be a positive integer'
+    score = item.get('score')
+    if not isinstance(score, (int, float)) or isinstance(score, bool) or not math.isfinite(score):
+        return None, 'score must be a number'
+    # Far out of range scores are rejected before rounding, which cannot represent them at 0.1 precision
+    if not 0 < score < 6:
+        return None, 'score must be between 1.0 and 5.0'
+    # Rounded the way the DECIMAL(2, 1) column stores it, so the summary deltas match the stored scores
+    score = decimal.Decimal(str(score)).quantize(decimal.Decimal('0.1'), rounding=decimal.ROUND_HALF_UP)
+    if not 1 <= score <= 5:
+        return None, 'score must be between 1.0 and 5.0'
+    return (user_id, movie_id, score), None
+
+
+def existing_ids(cursor, table, column, ids):
+    ids = sorted(set(ids))
+    found = set()
+    for start in range(0, len(ids), bulk_config['chunk_size']):
+        chunk = ids[start:start + bulk_config['chunk_size']]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+
+def chunked_executemany(cursor, query, rows):
+    for start in range(0, len(rows), bulk_config['chunk_size']):
+        cursor.executemany(query, rows[start:start + bulk_config['chunk_size']])
+
+
+@app.route('/ratings/bulk', methods=['POST'])
+@token_required
+def add_ratings_bulk(current_user):
+    """
+    Add Ratings in Bulk
+    ---
+    tags:
+      - Ratings
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: mode
+        in: query
+        required: false
+        schema:
+          type: string
+          enum: [insert, upsert]
+          default: insert
+        description: insert always adds a rating, upsert replaces the score of the user's existing rating of the movie
+    requestBody:
+      required: true
+      description: >
+        A JSON array of ratings, or one rating object per line with Content-Type application/x-ndjson.
+        user_id defaults to the authenticated user and may only differ from it for the admin.
+      content:
+        application/json:
+          schema:
+            type: array
+            items:
+              type: object
+              properties:
+                movie_id:
+                  type: integer
+                  example: 1
+                score:
+                  type: number
+                  format: float
+                  minimum: 1
+                  maximum: 5
+                  example: 4.5
+                user_id:
+                  type: integer
+                  example: 2
+        application/x-ndjson:
+          schema:
+            type: string
+    responses:
+      200:
+        description: Counts of accepted and rejected rows and the throughput of the batch
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                accepted:
+                  type: integer
+                inserted:
+                  type: integer
+                updated:
+                  type: integer
+                rejected:
+                  type: integer
+                rejections:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      index:
+                        type: integer
+                      error:
+                        type: string
+                elapsed_seconds:
+                  type: number
+                  format: float
+                rows_per_second:
+                  type: number
+                  format: float
+      400:
+        description: Invalid request
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Expected a JSON array
+      500:
+        description: Internal server error, nothing from the batch was written
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    mode = request.args.get('mode', 'insert')
+    if mode not in ('insert', 'upsert'):
+        return jsonify({'message': 'mode must be insert or upsert'}), 400
+
+    started = time.monotonic()
+    rejections = []
+    rows = []  # (index, user_id, movie_id, score)
+    try:
+        for index, item in enumerate(read_bulk_items()):
+            row, error = parse_bulk_rating(item, current_user)
+            if error:
+                rejections.append({'index': index, 'error': error})
+            else:
+                rows.append((index, *row))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if mode == 'upsert':
+        # The last row for a (user, movie) pair wins
+        latest = {}
+        for row in rows:
+            superseded = latest.pop((row[1], row[2]), None)
+            if superseded:
+                rejections.append({'index': superseded[0], 'error': 'Superseded by a later row for the same movie'})
+            latest[(row[1], row[2])] = row
+        rows = list(latest.values())
+
+    try:
+        connection = create_connection()
+        cursor = connection.cursor()
+
+        known_movies = existing_ids(cursor, 'movie', 'movie_id', [row[2] for row in rows])
+        known_users = existing_ids(cursor, 'user', 'user_id', [row[1] for row in rows])
+        valid_rows = []
+        for row in rows:
+            if row[2] not in known_movies:
+                rejections.append({'index': row[0], 'error': 'Movie not found'})
+            elif row[1] not in known_users:
+                rejections.append({'index': row[0], 'error': 'User not found'})
+            else:
+                valid_rows.append(row)
+
+        # Existing ratings to replace, locked until the batch commits: [(rating_id, user_id, movie_id, old score, new score)]
+        updates = []
+        if mode == 'upsert' and valid_rows:
+            wanted = {(row[1], row[2]): row[3] for row in valid_rows}
+            # Only the exact (user, movie) pairs of the batch are looked up and locked, chunk by chunk
+            pairs = sorted(wanted)
+            for start in range(0, len(pairs), bulk_config['chunk_size']):
+                chunk = pairs[start:start + bulk_config['chunk_size']]
+                query = f"""
+                    SELECT rating_id, user_id, movie_id, score FROM rating
+                    WHERE (user_id, movie_id) IN ({', '.join(['(%s, %s)'] * len(chunk))})
+                    FOR UPDATE
+                """
+                cursor.execute(query, [value for pair in chunk for value in pair])
+                updates += [(rating_id, user_id, movie_id, score, wanted[(user_id, movie_id)])
+                            for rating_id, user_id, movie_id, score in cursor.fetchall()]
+        updated_pairs = {(update[1], update[2]) for update in updates}
+        inserts = [row for row in valid_rows if (row[1], row[2]) not in updated_pairs]
+
+        # Existing ratings are rewritten by primary key as one multi-row statement
+        chunked_executemany(cursor, """
+            INSERT INTO rating (rating_id, user_id, movie_id, score) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE score = VALUES(score)
+        """, [(rating_id, user_id, movie_id, new_score) for rating_id, user_id, movie_id, _, new_score in updates])
+        chunked_executemany(cursor, "INSERT INTO rating (user_id, movie_id, score) VALUES (%s, %s, %s)",
+                            [(user_id, movie_id, score) for _, user_id, movie_id, score in inserts])
+
+        # One summary delta per movie for the whole batch
+        deltas = collections.defaultdict(lambda: [0, decimal.Decimal(0)])
+        for _, _, movie_id, score in inserts:
+            deltas[movie_id][0] += 1
+            deltas[movie_id][1] += score
+        for _, _, movie_id, old_score, new_score in updates:
+            deltas[movie_id][1] += new_score - old_score
+        chunked_executemany(cursor, """
+            INSERT INTO movie_rating_summary (movie_id, rating_count, rating_sum) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE rating_count = rating_count + VALUES(rating_count),
+                                    rating_sum = rating_sum + VALUES(rating_sum)
+        """, [(movie_id, count, total) for movie_id, (count, total) in sorted(deltas.items())])
+        mark_similarity_dirty(cursor, deltas)
+
+        connection.commit()
+        cursor.close()
+        connection.close()
+        if valid_rows:
+            invalidate_ratings(deltas)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    elapsed = time.monotonic() - started
+    rejections.sort(key=lambda rejection: rejection['index'])
+    return jsonify({
+        'accepted': len(valid_rows),
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'rejected': len(rejections),
+        'rejections': rejections,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(len(valid_rows) / elapsed, 1) if elapsed > 0 else None
+    }), 200
+
 # Get All Ratings for a Movie
 @app.route('/movies/<int:movie_id>/ratings', methods=['GET'])
 @token_required
@@ -1778,9 +6287,30 @@ def get_ratings_for_movie(current_user, movie_id):
         description: ID of the movie
         schema:
           type: integer
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of ratings to return (ignored when stream is true)
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
+      - name: stream
+        in: query
+        required: false
+        schema:
+          type: boolean
+          default: false
+        description: Stream every rating after the cursor as newline-delimited JSON instead of returning one page
     responses:
       200:
-        description: List of ratings for the specified movie
+        description: One page of ratings for the specified movie, or an NDJSON stream of rating objects when stream is true
         content:
           application/json:
             schema:
@@ -1800,6 +6330,22 @@ def get_ratings_for_movie(current_user, movie_id):
                         format: float
                       user_name:
                         type: string
+                next_cursor:
+                  type: string
+                  nullable: true
+          application/x-ndjson:
+            schema:
+              type: string
+      400:
+        description: Invalid cursor
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Invalid cursor
       500:
         description: Internal server error
         content:
@@ -1811,24 +6357,29 @@ def get_ratings_for_movie(current_user, movie_id):
                   type: string
                   example: Database connection error
     """
+    try:
+        after, limit = get_page_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    def rating_to_dict(rating):
+        return {'rating_id': rating[0], 'user_id': rating[1], 'score': rating[2], 'user_name': rating[3]}
+
     try:
         connection = create_connection()
-        cursor = connection.cursor()
 
-        query = """
-            SELECT r.rating_id, r.user_id, r.score, u.user_name 
-            FROM rating r
-            JOIN user u ON r.user_id = u.user_id
-            WHERE r.movie_id = %s
-        """
-        cursor.execute(query, (movie_id,))
+        query = queries['get_ratings_for_movie']
+        if wants_stream():
+            return stream_ndjson(connection, query, (movie_id, after or 0), rating_to_dict)
 
-        ratings = cursor.fetchall()
+        cursor = connection.cursor()
+        ratings, has_more = fetch_page(cursor, query + " LIMIT %s", (movie_id, after or 0), limit)
         cursor.close()
         connection.close()
 
-        rating_list = [{'rating_id': rating[0], 'user_id': rating[1], 'score': rating[2], 'user_name': rating[3]} for rating in ratings]
-        return jsonify({'ratings': rating_list}), 200
+        rating_list = [rating_to_dict(rating) for rating in ratings]
+        next_cursor = encode_cursor(rating_list[-1]['rating_id']) if has_more else None
+        return jsonify({'ratings': rating_list, 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1912,8 +6463,8 @@ def update_rating(current_user, rating_id):
         connection = create_connection()
         cursor = connection.cursor()
 
-        # Verify the rating belongs to the current user
-        query = "SELECT user_id FROM rating WHERE rating_id = %s"
+        # Verify the rating belongs to the current user, locking it until the summary is updated
+        query = queries['lock_rating']
         cursor.execute(query, (rating_id,))
         result = cursor.fetchone()
 
@@ -1927,9 +6478,18 @@ def update_rating(current_user, rating_id):
         cursor.execute(query, (score, rating_id))
 
         if cursor.rowcount > 0:
+            query = """
+                UPDATE movie_rating_summary s
+                JOIN rating r ON s.movie_id = r.movie_id
+                SET s.rating_sum = s.rating_sum - %s + r.score
+                WHERE r.rating_id = %s
+            """
+            cursor.execute(query, (result[2], rating_id))
+            mark_similarity_dirty(cursor, [result[1]])
             connection.commit()
             cursor.close()
             connection.close()
+            invalidate_ratings([result[1]])
             return jsonify({'message': 'Rating updated successfully'}), 200
         else:
             cursor.close()
@@ -2002,8 +6562,8 @@ def delete_rating(current_user, rating_id):
         connection = create_connection()
         cursor = connection.cursor()
 
-        # Verify the rating belongs to the current user
-        query = "SELECT user_id FROM rating WHERE rating_id = %s"
+        # Verify the rating belongs to the current user, locking it until the summary is updated
+        query = queries['lock_rating']
         cursor.execute(query, (rating_id,))
         result = cursor.fetchone()
 
@@ -2017,9 +6577,17 @@ def delete_rating(current_user, rating_id):
         cursor.execute(query, (rating_id,))
 
         if cursor.rowcount > 0:
+            query = """
+                UPDATE movie_rating_summary
+                SET rating_count = rating_count - 1, rating_sum = rating_sum - %s
+                WHERE movie_id = %s
+            """
+            cursor.execute(query, (result[2], result[1]))
+            mark_similarity_dirty(cursor, [result[1]])
             connection.commit()
             cursor.close()
             connection.close()
+            invalidate_ratings([result[1]])
             return jsonify({'message': 'Rating deleted successfully'}), 200
         else:
             cursor.close()
@@ -2111,9 +6679,30 @@ def get_reviews_for_movie(current_user, movie_id):
         description: ID of the movie
         schema:
           type: integer
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of reviews to return (ignored when stream is true)
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
+      - name: stream
+        in: query
+        required: false
+        schema:
+          type: boolean
+          default: false
+        description: Stream every review after the cursor as newline-delimited JSON instead of returning one page
     responses:
       200:
-        description: List of reviews for the specified movie
+        description: One page of reviews for the specified movie, or an NDJSON stream of review objects when stream is true
         content:
           application/json:
             schema:
@@ -2132,6 +6721,22 @@ def get_reviews_for_movie(current_user, movie_id):
                         type: string
                       user_name:
                         type: string
+                next_cursor:
+                  type: string
+                  nullable: true
+          application/x-ndjson:
+            schema:
+              type: string
+      400:
+        description: Invalid cursor
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Invalid cursor
       500:
         description: Internal server error
         content:
@@ -2143,24 +6748,168 @@ def get_reviews_for_movie(current_user, movie_id):
                   type: string
                   example: Database connection error
     """
+    try:
+        after, limit = get_page_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    def review_to_dict(review):
+        return {'review_id': review[0], 'user_id': review[1], 'review_text': review[2], 'user_name': review[3]}
+
     try:
         connection = create_connection()
+
+        query = queries['get_reviews_for_movie']
+        if wants_stream():
+            return stream_ndjson(connection, query, (movie_id, after or 0), review_to_dict)
+
         cursor = connection.cursor()
+        reviews, has_more = fetch_page(cursor, query + " LIMIT %s", (movie_id, after or 0), limit)
+        cursor.close()
+        connection.close()
 
-        query = """
-            SELECT r.review_id, r.user_id, r.review_text, u.user_name 
-            FROM review r
-            JOIN user u ON r.user_id = u.user_id
-            WHERE r.movie_id = %s
-        """
-        cursor.execute(query, (movie_id,))
+        review_list = [review_to_dict(review) for review in reviews]
+        next_cursor = encode_cursor(review_list[-1]['review_id']) if has_more else None
+        return jsonify({'reviews': review_list, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Search Reviews
+@app.route('/reviews/search', methods=['GET'])
+@token_required
+def search_reviews(current_user):
+    """
+    Search Reviews
+    ---
+    tags:
+      - Reviews
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: q
+        in: query
+        required: true
+        schema:
+          type: string
+          example: Tom Hardy
+        description: Words to look for in the review text (MySQL natural language full-text search)
+      - name: movie_id
+        in: query
+        required: false
+        schema:
+          type: integer
+        description: Only reviews of this movie
+      - name: user_id
+        in: query
+        required: false
+        schema:
+          type: integer
+        description: Only reviews written by this user
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+          maximum: 200
+        description: Number of reviews to return
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
+    responses:
+      200:
+        description: One page of matching reviews, most relevant first
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                reviews:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      review_id:
+                        type: integer
+                      movie_id:
+                        type: integer
+                      user_id:
+                        type: integer
+                      user_name:
+                        type: string
+                      review_text:
+                        type: string
+                      relevance:
+                        type: number
+                next_cursor:
+                  type: string
+                  nullable: true
+      400:
+        description: Missing query or invalid cursor
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: q is required
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    search = request.args.get('q', '').strip()
+    if not search:
+        return jsonify({'message': 'q is required'}), 400
+    movie_id = request.args.get('movie_id', type=int)
+    user_id = request.args.get('user_id', type=int)
+    limit = request.args.get('limit', default=pagination_config['default_limit'], type=int)
+    limit = max(1, min(limit, pagination_config['max_limit']))
+    try:
+        cursor_value = request.args.get('after')
+        after = decode_cursor(cursor_value) if cursor_value else None
+        if after is not None and not (isinstance(after, list) and len(after) == 2 and
+                                      isinstance(after[0], (int, float)) and isinstance(after[1], int)):
+            raise ValueError('Invalid cursor')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Pages are keyed on (relevance, review_id), which is also the sort order
+    relevance = queries['search_reviews_relevance']
+    query = queries['search_reviews'].format(relevance=relevance)
+    params = [search, search]
+    if movie_id is not None:
+        query += " AND r.movie_id = %s"
+        params.append(movie_id)
+    if user_id is not None:
+        query += " AND r.user_id = %s"
+        params.append(user_id)
+    if after is not None:
+        query += f" AND ({relevance} < %s OR ({relevance} = %s AND r.review_id > %s))"
+        params += [search, after[0], search, after[0], after[1]]
+    query += queries['search_reviews_order']
 
-        reviews = cursor.fetchall()
+    try:
+        connection = create_connection()
+        cursor = connection.cursor()
+        reviews, has_more = fetch_page(cursor, query, tuple(params), limit)
         cursor.close()
         connection.close()
 
-        review_list = [{'review_id': review[0], 'user_id': review[1], 'review_text': review[2], 'user_name': review[3]} for review in reviews]
-        return jsonify({'reviews': review_list}), 200
+        review_list = [{'review_id': review[0], 'movie_id': review[1], 'user_id': review[2], 'user_name': review[3],
+                        'review_text': review[4], 'relevance': float(review[5])} for review in reviews]
+        next_cursor = encode_cursor([review_list[-1]['relevance'], review_list[-1]['review_id']]) if has_more else None
+        return jsonify({'reviews': review_list, 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2242,7 +6991,7 @@ def update_review(current_user, review_id):
         cursor = connection.cursor()
 
         # Verify the review belongs to the current user
-        query = "SELECT user_id FROM review WHERE review_id = %s"
+        query = queries['review_owner']
         cursor.execute(query, (review_id,))
         result = cursor.fetchone()
 
@@ -2332,7 +7081,7 @@ def delete_review(current_user, review_id):
         cursor = connection.cursor()
 
         # Verify the review belongs to the current user
-        query = "SELECT user_id FROM review WHERE review_id = %s"
+        query = queries['review_owner']
         cursor.execute(query, (review_id,))
         result = cursor.fetchone()
 
@@ -2390,6 +7139,36 @@ def add_to_watch_history(current_user):
                 message:
                   type: string
                   example: Movie added to watch history
+      202:
+        description: Movie queued for the watch history (buffered mode with durability 'buffer')
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Movie queued for watch history
+      400:
+        description: Invalid movie_id (buffered mode)
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: movie_id must be an integer
+      503:
+        description: The watch history buffer is full or its batch was not committed in time
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Watch history buffer is full
       500:
         description: Internal server error
         content:
@@ -2404,12 +7183,29 @@ def add_to_watch_history(current_user):
     data = request.get_json()
     movie_id = data.get('movie_id')
 
+    if watch_history_config['mode'] == 'buffered':
+        # A malformed row would fail the whole batch it is flushed with, so it is rejected here
+        if not isinstance(movie_id, int) or isinstance(movie_id, bool):
+            return jsonify({'message': 'movie_id must be an integer'}), 400
+        try:
+            event = watch_history_buffer.add(current_user, movie_id)
+        except queue.Full as e:
+            return jsonify({'message': str(e)}), 503
+        if watch_history_config['durability'] == 'buffer':
+            return jsonify({'message': 'Movie queued for watch history'}), 202
+        if not event.done.wait(watch_history_config['ack_timeout']):
+            return jsonify({'message': 'Watch history batch was not committed in time'}), 503
+        if event.error is not None:
+            return jsonify({'error': str(event.error)}), 500
+        return jsonify({'message': 'Movie added to watch history'}), 201
+
     try:
         connection = create_connection()
         cursor = connection.cursor()
 
         query = "INSERT INTO watch_history (user_id, movie_id) VALUES (%s, %s)"
         cursor.execute(query, (current_user, movie_id))
+        mark_similarity_dirty(cursor, [movie_id])
         connection.commit()
 
         cursor.close()
@@ -2465,13 +7261,7 @@ def get_watch_history_for_user(current_user):
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = """
-            SELECT h.history_id, h.movie_id, m.title 
-            FROM watch_history h
-            JOIN movie m ON h.movie_id = m.movie_id
-            WHERE h.user_id = %s
-        """
-        cursor.execute(query, (current_user,))
+        cursor.execute(queries['get_watch_history_for_user'], (current_user,))
         
         watch_history = cursor.fetchall()
         cursor.close()
@@ -2564,7 +7354,7 @@ def add_recommendation(current_user):
         cursor = connection.cursor()
 
         # Check if the user has already watched the movie
-        check_query = "SELECT history_id FROM watch_history WHERE user_id = %s AND movie_id = %s"
+        check_query = queries['watched_movie']
         cursor.execute(check_query, (user_id, movie_id))
         watched = cursor.fetchone()
 
@@ -2584,6 +7374,32 @@ def add_recommendation(current_user):
         return jsonify({'error': str(e)}), 500
 
 
+def computed_recommendations(cursor, user_id, k):
+    # Returns ([(movie_id, score)], source): the collaborative model's picks when it knows the user, otherwise the
+    # content recommender's, seeded with the movies the user rated well or watched and their preferences text
+    query = """
+        SELECT movie_id, MAX(liked) FROM (
+            SELECT movie_id, score >= %s AS liked FROM rating WHERE user_id = %s
+            UNION ALL
+            SELECT movie_id, 1 FROM watch_history WHERE user_id = %s
+        ) AS seen
+        GROUP BY movie_id
+    """
+    cursor.execute(query, (recommender_config['relevant_score'], user_id, user_id))
+    seen = dict(cursor.fetchall())
+
+    model = recommender_model.get()
+    if model is not None:
+        recommendations = model.recommend(user_id, seen, k)
+        if recommendations:
+            return recommendations, 'collaborative'
+
+    cursor.execute("SELECT preferences FROM user WHERE user_id = %s", (user_id,))
+    user = cursor.fetchone()
+    liked = [movie_id for movie_id, is_liked in seen.items() if is_liked]
+    return content_index.recommend(liked, user[0] if user else None, seen, k), 'content'
+
+
 # Get Recommendations for the Current User
 @app.route('/recommendations', methods=['GET'])
 @token_required
@@ -2597,7 +7413,10 @@ def get_recommendations_for_user(current_user):
       - BearerAuth: []
     responses:
       200:
-        description: List of recommendations for the current user
+        description: >
+          List of recommendations for the current user. Stored recommendations come first; users without any get
+          the collaborative model's picks, and users the model does not know (no ratings at training time) get
+          movies whose description and genres resemble what they liked, watched or wrote in their preferences
         content:
           application/json:
             schema:
@@ -2610,10 +7429,15 @@ def get_recommendations_for_user(current_user):
                     properties:
                       recommendation_id:
                         type: integer
+                        nullable: true
+                        description: Null for computed recommendations
                       movie_id:
                         type: integer
                       title:
                         type: string
+                source:
+                  type: string
+                  enum: [stored, collaborative, content]
       500:
         description: Internal server error
         content:
@@ -2629,20 +7453,316 @@ def get_recommendations_for_user(current_user):
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = """
-            SELECT r.recommendation_id, r.movie_id, m.title 
-            FROM recommendation r
-            JOIN movie m ON r.movie_id = m.movie_id
-            WHERE r.user_id = %s
-        """
-        cursor.execute(query, (current_user,))
+        cursor.execute(queries['get_recommendations_for_user'], (current_user,))
         
         recommendations = cursor.fetchall()
+        recommendation_list = [{'recommendation_id': rec[0], 'movie_id': rec[1], 'title': rec[2]} for rec in recommendations]
+        source = 'stored'
+        if not recommendation_list and np is not None:
+            computed, source = computed_recommendations(cursor, current_user, recommender_config['top_k'])
+            titles = {}
+            if computed:
+                placeholders = ', '.join(['%s'] * len(computed))
+                cursor.execute(f"SELECT movie_id, title FROM movie WHERE movie_id IN ({placeholders})",
+                               [movie_id for movie_id, _ in computed])
+                titles = dict(cursor.fetchall())
+            recommendation_list = [{'recommendation_id': None, 'movie_id': movie_id, 'title': titles[movie_id]}
+                                   for movie_id, _ in computed if movie_id in titles]
         cursor.close()
         connection.close()
 
-        recommendation_list = [{'recommendation_id': rec[0], 'movie_id': rec[1], 'title': rec[2]} for rec in recommendations]
-        return jsonify({'recommendations': recommendation_list}), 200
+        return jsonify({'recommendations': recommendation_list, 'source': source}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Get Model Recommendations for the Current User
+@app.route('/recommendations/personalized', methods=['GET'])
+@token_required
+def get_personalized_recommendations(current_user):
+    """
+    Get Collaborative-Filtering Recommendations for the Current User
+    ---
+    tags:
+      - Recommendations
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: k
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 10
+          maximum: 100
+        description: Number of movies to recommend
+    responses:
+      200:
+        description: Movies the user has neither rated nor watched, best predicted score first (empty for users without ratings at training time)
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                recommendations:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      movie_id:
+                        type: integer
+                      title:
+                        type: string
+                      predicted_score:
+                        type: number
+                        example: 4.42
+                trained_at:
+                  type: string
+                  example: "2024-01-01T00:00:00Z"
+      503:
+        description: The recommender is not available
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Recommendation model has not been trained
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if np is None:
+        return jsonify({'message': 'The recommender needs numpy and scipy'}), 503
+    k = request.args.get('k', default=recommender_config['top_k'], type=int)
+    k = max(1, min(k, 100))
+    try:
+        model = recommender_model.get()
+        if model is None:
+            return jsonify({'message': 'Recommendation model has not been trained'}), 503
+
+        connection = create_connection()
+        cursor = connection.cursor()
+
+        # Like add_recommendation, nothing the user already watched is recommended, nor anything they rated
+        cursor.execute("""
+            SELECT movie_id FROM watch_history WHERE user_id = %s
+            UNION
+            SELECT movie_id FROM rating WHERE user_id = %s
+        """, (current_user, current_user))
+        seen = {row[0] for row in cursor.fetchall()}
+
+        recommendations = model.recommend(current_user, seen, k) or []
+        titles = {}
+        if recommendations:
+            placeholders = ', '.join(['%s'] * len(recommendations))
+            cursor.execute(f"SELECT movie_id, title FROM movie WHERE movie_id IN ({placeholders})",
+                           [movie_id for movie_id, _ in recommendations])
+            titles = dict(cursor.fetchall())
+        cursor.close()
+        connection.close()
+
+        # Movies deleted since training are dropped
+        recommendation_list = [{'movie_id': movie_id, 'title': titles[movie_id], 'predicted_score': round(score, 2)}
+                               for movie_id, score in recommendations if movie_id in titles]
+        return jsonify({'recommendations': recommendation_list, 'trained_at': model.info.get('trained_at')}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/recommendations/model', methods=['GET'])
+@token_required
+def recommendation_model_stats(current_user):
+    """
+    Recommendation Model Statistics (Admin Only)
+    ---
+    tags:
+      - Monitoring
+    security:
+      - BearerAuth: []
+    responses:
+      200:
+        description: What the current model was trained on, how long training took and its recall@K
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                trained_at:
+                  type: string
+                ratings:
+                  type: integer
+                users:
+                  type: integer
+                movies:
+                  type: integer
+                factors:
+                  type: integer
+                iterations:
+                  type: integer
+                training_seconds:
+                  type: number
+                top_k:
+                  type: integer
+                recall_at_k:
+                  type: number
+                  nullable: true
+                evaluated_users:
+                  type: integer
+      403:
+        description: Access denied
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Access denied
+      503:
+        description: The recommender is not available
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Recommendation model has not been trained
+    """
+    if current_user != 1:
+        return jsonify({'message': 'Access denied'}), 403
+    if np is None:
+        return jsonify({'message': 'The recommender needs numpy and scipy'}), 503
+    model = recommender_model.get()
+    if model is None:
+        return jsonify({'message': 'Recommendation model has not been trained'}), 503
+    return jsonify(model.info), 200
+
+
+@app.route('/recommendations/nearest', methods=['GET'])
+@token_required
+def get_nearest_recommendations(current_user):
+    """
+    Get Recommendations for the Current User from the Nearest-Neighbour Index
+    ---
+    tags:
+      - Recommendations
+    security:
+      - BearerAuth: []
+    parameters:
+      - name: k
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 10
+          maximum: 100
+        description: Number of movies to recommend
+      - name: nprobe
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 8
+        description: Inverted lists to scan, more lists find more of the exact top movies at higher latency
+    responses:
+      200:
+        description: Approximately the movies with the best predicted score that the user has neither rated nor watched
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                recommendations:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      movie_id:
+                        type: integer
+                      title:
+                        type: string
+                      predicted_score:
+                        type: number
+                scanned:
+                  type: integer
+                  description: Number of movie vectors compared
+                search_ms:
+                  type: number
+                  description: Time spent in the index search
+      503:
+        description: The index is not available
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                message:
+                  type: string
+                  example: Nearest-neighbour index has not been built
+      500:
+        description: Internal server error
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                error:
+                  type: string
+                  example: Database connection error
+    """
+    if np is None:
+        return jsonify({'message': 'The recommender needs numpy and scipy'}), 503
+    k = max(1, min(request.args.get('k', default=recommender_config['top_k'], type=int), 100))
+    nprobe = request.args.get('nprobe', default=ann_config['nprobe'], type=int)
+    try:
+        model = recommender_model.get()
+        index = ann_index.get()
+        if model is None or index is None:
+            return jsonify({'message': 'Nearest-neighbour index has not been built'}), 503
+        # User factors only make sense against movie factors of the same training run
+        if index.info.get('model_id') != model.model_id:
+            return jsonify({'message': 'Nearest-neighbour index is older than the model, run build-ann-index'}), 503
+        row = id_rows([current_user], model.user_ids)[0]
+        if row < 0:
+            return jsonify({'recommendations': [], 'scanned': 0, 'search_ms': 0.0}), 200
+
+        connection = create_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT movie_id FROM watch_history WHERE user_id = %s
+            UNION
+            SELECT movie_id FROM rating WHERE user_id = %s
+        """, (current_user, current_user))
+        seen = {row[0] for row in cursor.fetchall()}
+
+        started = time.perf_counter()
+        recommendations, scanned = index.search(model.user_factors[row], k, nprobe, seen)
+        search_ms = (time.perf_counter() - started) * 1000
+
+        titles = {}
+        if recommendations:
+            placeholders = ', '.join(['%s'] * len(recommendations))
+            cursor.execute(f"SELECT movie_id, title FROM movie WHERE movie_id IN ({placeholders})",
+                           [movie_id for movie_id, _ in recommendations])
+            titles = dict(cursor.fetchall())
+        cursor.close()
+        connection.close()
+
+        recommendation_list = [{'movie_id': movie_id, 'title': titles[movie_id],
+                                'predicted_score': round(model.mean + score, 2)}
+                               for movie_id, score in recommendations if movie_id in titles]
+        return jsonify({'recommendations': recommendation_list, 'scanned': scanned,
+                        'search_ms': round(search_ms, 3)}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2720,7 +7840,7 @@ def delete_recommendation(current_user, user_id, movie_id):
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = "DELETE FROM recommendation WHERE user_id = %s AND movie_id = %s"
+        query = queries['delete_recommendation']
         cursor.execute(query, (user_id, movie_id))
         
         if cursor.rowcount > 0:
@@ -2870,7 +7990,7 @@ def login():
         connection = create_connection()
         cursor = connection.cursor(dictionary=True)
 
-        query = "SELECT * FROM user WHERE email = %s"
+        query = queries['login']
         cursor.execute(query, (email,))
         user = cursor.fetchone()
 
@@ -2882,7 +8002,7 @@ def login():
             token = jwt.encode(
                 {
                     'user_id': user['user_id'],
-                    'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+                    'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
                 },
                 app.config['SECRET_KEY'],
                 algorithm='HS256'
@@ -2898,19 +8018,33 @@ def login():
 @token_required
 def filter_movies(current_user):
     """
-    Filter Movies by Genre, Duration, and Rating
+    Filter Movies by Genres, Duration, and Rating
     ---
     tags:
       - Movies
     security:
       - BearerAuth: []
     parameters:
+      - name: genres
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Comma separated genre names; without genres every movie is considered
+      - name: match
+        in: query
+        required: false
+        schema:
+          type: string
+          enum: [all, any]
+          default: all
+        description: Whether a movie needs all of the genres or any of them
       - name: genre_name
         in: query
-        required: true
+        required: false
         schema:
           type: string
-        description: Name of the genre to filter by
+        description: Name of a single genre to filter by, kept for older clients
       - name: min_duration
         in: query
         required: false
@@ -2933,14 +8067,49 @@ def filter_movies(current_user):
           format: float
           default: 0
         description: Minimum average rating of the movie
+      - name: max_rating
+        in: query
+        required: false
+        schema:
+          type: number
+          format: float
+          default: 5
+        description: Maximum average rating of the movie
+      - name: sort
+        in: query
+        required: false
+        schema:
+          type: string
+          enum: [rating, duration, movie_id]
+          default: rating
+        description: Best rated first, shortest first, or by id
+      - name: limit
+        in: query
+        required: false
+        schema:
+          type: integer
+          default: 50
+        description: Maximum number of movies to return
+      - name: after
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Cursor returned as next_cursor by the previous page
     responses:
       200:
-        description: List of movies matching the filter criteria
+        description: Page of the movies matching the filter criteria
         content:
           application/json:
             schema:
               type: object
               properties:
+                total:
+                  type: integer
+                  description: Number of movies matching the filter
+                next_cursor:
+                  type: string
+                  nullable: true
                 movies:
                   type: array
                   items:
@@ -2957,6 +8126,8 @@ def filter_movies(current_user):
                       avg_rating:
                         type: number
                         format: float
+      400:
+        description: Invalid filter parameters
       500:
         description: Internal server error
         content:
@@ -2968,38 +8139,76 @@ def filter_movies(current_user):
                   type: string
                   example: Database connection error
     """
-    data = request.get_json()  
-    genre_name = data.get('genre_name')
-    min_duration = data.get('min_duration')
-    max_duration = data.get('max_duration')
-    min_rating = data.get('min_rating')
-
+    # Older clients send the filter as a JSON body
+    data = request.get_json(silent=True) or {}
+    try:
+        genres = request.args.get('genres', data.get('genres'))
+        if isinstance(genres, str):
+            genres = [genre_name.strip() for genre_name in genres.split(',') if genre_name.strip()]
+        genres = list(dict.fromkeys(genres or []))
+        genre_name = request.args.get('genre_name', data.get('genre_name'))
+        if genre_name and genre_name not in genres:
+            genres.append(genre_name)
+        match = request.args.get('match', data.get('match', 'all'))
+        if match not in ('all', 'any'):
+            raise ValueError('match must be all or any')
+        sort = request.args.get('sort', data.get('sort', 'rating'))
+        if sort not in filter_config['sorts']:
+            raise ValueError(f"sort must be one of {', '.join(filter_config['sorts'])}")
+        bounds = {}
+        for name, default in (('min_duration', filter_config['default_min_duration']),
+                              ('max_duration', filter_config['default_max_duration']),
+                              ('min_rating', 0), ('max_rating', 5)):
+            value = request.args.get(name, data.get(name))
+            bounds[name] = default if value is None else float(value)
+        limit = request.args.get('limit', default=pagination_config['default_limit'], type=int)
+        limit = max(1, min(limit, pagination_config['max_limit']))
+        cursor_value = request.args.get('after')
+        after = decode_cursor(cursor_value) if cursor_value else None
+        if after is not None and not (isinstance(after, list) and len(after) == 2 and
+                                      isinstance(after[0], (int, float)) and isinstance(after[1], int)):
+            raise ValueError('Invalid cursor')
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': str(e)}), 400
 
     try:
+        if np is not None:
+            movie_list, total, next_after = movie_filter.filter(
+                genres, match == 'all', bounds['min_duration'], bounds['max_duration'], bounds['min_rating'],
+                bounds['max_rating'], sort, after, limit)
+            next_cursor = encode_cursor(next_after) if next_after is not None else None
+            return jsonify({'movies': movie_list, 'total': total, 'next_cursor': next_cursor}), 200
+
+        # Without numpy the same filter runs in MySQL; a genre condition counts the requested genres a movie has
+        conditions = queries['filter_movies_ranges']
+        params = [bounds['min_duration'], bounds['max_duration'], bounds['min_rating'], bounds['max_rating']]
+        if genres:
+            placeholders = ', '.join(['%s'] * len(genres))
+            conditions += queries['filter_movies_genres'].format(placeholders=placeholders)
+            params += genres + [len({genre_name.lower() for genre_name in genres}) if match == 'all' else 1]
+        sort_column = {'rating': 'COALESCE(s.avg_rating, 0)', 'duration': 'm.duration', 'movie_id': 'm.movie_id'}[sort]
+        direction, comparison = ('DESC', '<') if sort == 'rating' else ('ASC', '>')
+
         connection = create_connection()
         cursor = connection.cursor()
-
-        query = """
-            SELECT m.movie_id, m.title, m.description, m.duration, 
-                   COALESCE(AVG(r.score), 0) AS avg_rating
-            FROM movie m
-            JOIN movie_genre mg ON m.movie_id = mg.movie_id
-            JOIN genre g ON mg.genre_id = g.genre_id
-            LEFT JOIN rating r ON m.movie_id = r.movie_id
-            WHERE g.genre_name = %s
-            AND m.duration BETWEEN %s AND %s
-            GROUP BY m.movie_id
-            HAVING avg_rating >= %s
-        """
-        cursor.execute(query, (genre_name, min_duration, max_duration, min_rating))
-        movies = cursor.fetchall()
+        cursor.execute(queries['filter_movies_count'].format(conditions=conditions), tuple(params))
+        total = cursor.fetchone()[0]
+        if after is not None:
+            conditions += f" AND ({sort_column} {comparison} %s OR ({sort_column} = %s AND m.movie_id > %s))"
+            params += [after[0], after[0], after[1]]
+        query = queries['filter_movies'].format(conditions=conditions, sort_column=sort_column, direction=direction)
+        movies, has_more = fetch_page(cursor, query, tuple(params), limit)
 
         cursor.close()
         connection.close()
 
         movie_list = [{'movie_id': movie[0], 'title': movie[1], 'description': movie[2],
                        'duration': movie[3], 'avg_rating': float(movie[4])} for movie in movies]
-        return jsonify({'movies': movie_list}), 200
+        next_cursor = None
+        if has_more:
+            last = movie_list[-1]
+            next_cursor = encode_cursor([last['avg_rating'] if sort == 'rating' else last[sort], last['movie_id']])
+        return jsonify({'movies': movie_list, 'total': total, 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3051,6 +8260,14 @@ def top_movies_by_genre(current_user):
                       rating:
                         type: number
                         format: float
+                snapshot_age:
+                  type: number
+                  nullable: true
+                  description: Seconds since the analytics snapshot the answer comes from was built (catalog and
+                    rating writes refresh it). Null without numpy, when the answer is queried from MySQL through
+                    the analytics and shared caches
+      400:
+        description: Missing genre_name or invalid limit
       500:
         description: Internal server error
         content:
@@ -3062,33 +8279,40 @@ def top_movies_by_genre(current_user):
                   type: string
                   example: Database connection error
     """
-    data = request.get_json()  
-    genre_name = data.get('genre_name')
-    limit = data.get('limit')
-
+    # Older clients send the parameters as a JSON body
+    data = request.get_json(silent=True) or {}
+    # The name is normalized once so the query and every cache key agree; MySQL compares it case-insensitively
+    genre_name = str(request.args.get('genre_name', data.get('genre_name')) or '').strip()
+    if not genre_name:
+        return jsonify({'message': 'genre_name is required'}), 400
     try:
+        limit = int(request.args.get('limit', data.get('limit', 10)))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'limit must be an integer'}), 400
+
+    def load_top_movies():
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = """
-            SELECT m.movie_id, m.title, m.description, COALESCE(AVG(r.score), 0) AS avg_rating
-            FROM movie m
-            JOIN movie_genre mg ON m.movie_id = mg.movie_id
-            JOIN genre g ON mg.genre_id = g.genre_id
-            LEFT JOIN rating r ON m.movie_id = r.movie_id
-            WHERE g.genre_name = %s
-            ORDER BY avg_rating DESC
-            LIMIT %s
-        """
-        cursor.execute(query, (genre_name, limit))
+        cursor.execute(queries['top_movies_by_genre'], (genre_name, limit))
         movies = cursor.fetchall()
 
         cursor.close()
         connection.close()
 
         movie_list = [{'movie_id': movie[0], 'title': movie[1], 'description': movie[2],
-                       'rating': movie[3]} for movie in movies]
-        return jsonify({'movies': movie_list}), 200
+                       'rating': float(movie[3])} for movie in movies]
+        return {'movies': movie_list}
+
+    try:
+        if np is not None:
+            columns = analytics_snapshot.get()
+            return jsonify({'movies': columns.top_movies(genre_name, limit), 'snapshot_age': columns.age()}), 200
+        # Differently cased requests share one result
+        key = ('top_movies', genre_name.lower(), limit)
+        result = analytics_cache.get(key, lambda: shared_cache.get_or_compute(
+            ['catalog', 'ratings'], 'top_movies', [genre_name.lower(), limit], load_top_movies))
+        return jsonify({**result, 'snapshot_age': None}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3123,6 +8347,12 @@ def genre_statistics(current_user):
                         type: number
                         format: float
                         nullable: true
+                snapshot_age:
+                  type: number
+                  nullable: true
+                  description: Seconds since the analytics snapshot the answer comes from was built (catalog and
+                    rating writes refresh it). Null without numpy, when the answer is queried from MySQL through
+                    the analytics and shared caches
       500:
         description: Internal server error
         content:
@@ -3134,29 +8364,27 @@ def genre_statistics(current_user):
                   type: string
                   example: Database connection error
     """
-    try:
+    def load_statistics():
         connection = create_connection()
         cursor = connection.cursor()
 
-        query ="""
-            SELECT g.genre_name, COUNT(m.movie_id) AS movie_count, AVG(r.score) AS avg_rating
-            FROM genre g
-            LEFT JOIN movie_genre mg ON g.genre_id = mg.genre_id
-            LEFT JOIN movie m ON mg.movie_id = m.movie_id
-            LEFT JOIN rating r ON m.movie_id = r.movie_id
-            GROUP BY g.genre_name
-            ORDER BY movie_count DESC
-        """ 
-
-        cursor.execute(query)
+        cursor.execute(queries['genre_statistics'])
         stats = cursor.fetchall()
 
         cursor.close()
         connection.close()
 
-        genre_stats = [{'genre_name': stat[0], 'movie_count': stat[1], 'avg_rating': round(stat[2], 2) if stat[2] else None}
-                       for stat in stats]
-        return jsonify({'statistics': genre_stats}), 200
+        genre_stats = [{'genre_name': stat[0], 'movie_count': stat[1],
+                        'avg_rating': round(float(stat[2]), 2) if stat[2] else None} for stat in stats]
+        return {'statistics': genre_stats}
+
+    try:
+        if np is not None:
+            columns = analytics_snapshot.get()
+            return jsonify({'statistics': columns.genre_statistics(), 'snapshot_age': columns.age()}), 200
+        result = analytics_cache.get(('genre_statistics',), lambda: shared_cache.get_or_compute(
+            ['catalog', 'ratings'], 'genre_statistics', [], load_statistics))
+        return jsonify({**result, 'snapshot_age': None}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3202,27 +8430,16 @@ def get_genres_of_top_rated_movie(current_user):
         connection = create_connection()
         cursor = connection.cursor()
 
-        query = """
-            SELECT DISTINCT g.genre_id, g.genre_name
-            FROM genre g
-            JOIN movie_genre mg ON g.genre_id = mg.genre_id
-            WHERE mg.movie_id IN (
-                SELECT m.movie_id
-                FROM movie m
-                LEFT JOIN rating r ON m.movie_id = r.movie_id
-                GROUP BY m.movie_id
-                HAVING AVG(COALESCE(r.score, 0)) = (
-                    SELECT MAX(avg_rating)
-                    FROM (
-                        SELECT AVG(COALESCE(r.score, 0)) AS avg_rating
-                        FROM movie m
-                        LEFT JOIN rating r ON m.movie_id = r.movie_id
-                        GROUP BY m.movie_id
-                    ) AS subquery
-                )
-            )
-        """
-        cursor.execute(query)
+        # The highest average is the last entry of the avg_rating index, no ratings are aggregated here
+        cursor.execute(queries['top_average_rating'])
+        top_rating = cursor.fetchone()[0]
+
+        if top_rating:
+            # Every movie sharing the top average counts, as ties always have
+            cursor.execute(queries['top_rated_genres'], (top_rating,))
+        else:
+            # Nothing is rated yet, so every movie ties at an average of 0
+            cursor.execute(queries['genres_with_movies'])
         genres = cursor.fetchall()
 
         cursor.close()
@@ -3234,4 +8451,4 @@ def get_genres_of_top_rated_movie(current_user):
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,74 @@
+import datetime
+import json
+import os
+import sys
+
+import jwt
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sourcecode_of_app_and_documentation as app_module
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.rows = list(self.connection.rows)
+
+    def fetchmany(self, size):
+        if self.connection.closed or self.connection.idle:
+            raise mysql.connector.errors.OperationalError("connection closed")
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        self.connection.events.append('cursor.close')
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.events = []
+        self.closed = False
+        self.idle = False
+
+    def cursor(self, **kwargs):
+        self.idle = False
+        return FakeCursor(self)
+
+    def rollback(self):
+        # mysql-connector drains unread rows on rollback; the stream has nothing left to read afterwards
+        self.events.append('rollback')
+        self.idle = True
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.events.append('close')
+        self.closed = True
+
+
+def auth_headers(user_id=1):
+    token = jwt.encode({'user_id': user_id, 'exp': datetime.datetime.now(datetime.timezone.utc)
+                        + datetime.timedelta(hours=1)}, app_module.app.config['SECRET_KEY'], algorithm='HS256')
+    return {'Authorization': 'Bearer ' + token}
+
+
+def test_streamed_ratings_are_read_before_the_connection_is_released(monkeypatch):
+    rows = [(rating_id, 7, 4.0, f"user{rating_id}") for rating_id in range(1, 2 * 1000 + 2)]
+    connection = FakeConnection(rows)
+    monkeypatch.setattr(app_module.connection_pool, '_idle', app_module.collections.deque())
+    monkeypatch.setattr(app_module.connection_pool, '_connect', lambda: connection)
+    monkeypatch.setitem(app_module.pagination_config, 'stream_chunk_size', 1000)
+
+    response = app_module.app.test_client().get('/movies/1/ratings?stream=1', headers=auth_headers())
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert response.status_code == 200
+    assert [json.loads(line)['rating_id'] for line in lines] == [row[0] for row in rows]
+    assert connection.events == ['cursor.close', 'rollback']